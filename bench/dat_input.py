@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Compare the DAT line parser against the previous regular expression
+based one.
+
+Reports the wall time of processing a DAT directory with both parsers,
+optionally on synthetic 2d and 3d files with wide lines, and the peak
+traced memory of reading it all at once compared to streaming it one
+interval at a time:
+
+    PYTHONPATH=. python3 bench/dat_input.py tests/20190719
+    PYTHONPATH=. python3 bench/dat_input.py --lines 1440 --width 2000
+"""
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from dsc_datatool import Dataset, Dimension
+from dsc_datatool.input.dat import DAT
+
+
+class RegexDAT(DAT):
+    """The line parsing of `DAT` as it was before, using `re` and
+    `list.pop(0)`."""
+
+
+    def read2d(self, file, name, field):
+        for l in self._lines(file):
+            if re.match(r'^#', l):
+                continue
+            l = re.sub(r'[\r\n]+$', '', l)
+            dat = re.split(r'\s+', l)
+
+            dataset = Dataset()
+            dataset.name = name
+            dataset.start_time = int(dat.pop(0))
+            dataset.stop_time = dataset.start_time + 60
+
+            d1 = Dimension('All')
+            d1.value = 'ALL'
+            dataset.dimensions.append(d1)
+
+            d2 = Dimension(field)
+            while dat:
+                if len(dat) < 2:
+                    raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
+                k = dat.pop(0)
+                v = dat.pop(0)
+                d2.values[k] = int(v)
+            d1.dimensions.append(d2)
+
+            yield dataset
+
+
+    def read3d(self, file, name, first, second):
+        for l in self._lines(file):
+            if re.match(r'^#', l):
+                continue
+            l = re.sub(r'[\r\n]+$', '', l)
+            dat = re.split(r'\s+', l)
+
+            dataset = Dataset()
+            dataset.name = name
+            dataset.start_time = int(dat.pop(0))
+            dataset.stop_time = dataset.start_time + 60
+
+            while dat:
+                if len(dat) < 2:
+                    raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
+                k = dat.pop(0)
+                v = dat.pop(0)
+
+                d1 = Dimension(first)
+                d1.value = k
+                dataset.dimensions.append(d1)
+
+                d2 = Dimension(second)
+                dat2 = v.split(':')
+                while dat2:
+                    if len(dat2) < 2:
+                        raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
+                    k2 = dat2.pop(0)
+                    v2 = dat2.pop(0)
+                    d2.values[k2] = int(v2)
+                d1.dimensions.append(d2)
+
+            yield dataset
+
+
+def synthesize(lines, width):
+    dir = tempfile.mkdtemp()
+    with open(os.path.join(dir, 'client_port_range.dat'), 'w') as f:
+        for n in range(lines):
+            f.write('%d %s\n' % (1563520560 + n * 60, ' '.join('%d-%d %d' % (p * 32, p * 32 + 31, p % 13) for p in range(width))))
+    with open(os.path.join(dir, 'qtype_vs_qnamelen.dat'), 'w') as f:
+        for n in range(lines):
+            f.write('%d %s\n' % (1563520560 + n * 60, ' '.join('%d %s' % (q, ':'.join('%d:%d' % (l, l % 7) for l in range(width // 10))) for q in range(10))))
+    return dir
+
+
+def measure(input, dir, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        input.process(dir)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def peak(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def stream(dir):
+    for datasets in DAT().stream(dir):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DAT input parsers.')
+    parser.add_argument('dir', nargs='*')
+    parser.add_argument('--lines', type=int, default=0,
+        help='Also benchmark synthetic files with this many lines.')
+    parser.add_argument('--width', type=int, default=1000,
+        help='Number of pairs on each line of the synthetic files.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    dirs = list(args.dir)
+    tmp = None
+    if args.lines:
+        tmp = synthesize(args.lines, args.width)
+        dirs.append(tmp)
+
+    try:
+        for dir in dirs:
+            print(dir)
+            for name, input in (('regex', RegexDAT()), ('split', DAT())):
+                elapsed = measure(input, dir, args.repeat)
+                print('  %-6s %10.3f ms' % (name, elapsed * 1000))
+            print('  %-6s %10.1f KiB peak' % ('all', peak(lambda: DAT().process(dir)) / 1024))
+            print('  %-6s %10.1f KiB peak' % ('stream', peak(lambda: stream(dir)) / 1024))
+    finally:
+        if tmp:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Compare the memory used by the slotted `Dataset` and `Dimension` against
+the previous plain classes, which allocated both `values` and `dimensions`
+for every dimension, with and without interning names and keys.
+
+Reports the traced memory held by the datasets read from the given XML
+files and DAT directories, optionally also from a synthetic XML file with
+a large `client_subnet` array and synthetic DAT files:
+
+    PYTHONPATH=. python3 bench/objects.py tests/1563520620.dscdata.xml tests/20190719
+    PYTHONPATH=. python3 bench/objects.py --subnets 200000 --lines 1440
+"""
+
+import argparse
+import os
+import shutil
+import tracemalloc
+
+import dsc_datatool.input.xml
+import dsc_datatool.input.dat
+from dsc_datatool import Dataset, Dimension, intern
+
+import xml_input
+import dat_input
+
+
+class PlainDataset(object):
+    """`Dataset` as it was before using slots."""
+    name = None
+    start_time = None
+    stop_time = None
+    dimensions = None
+
+
+    def __init__(self):
+        self.dimensions = []
+
+
+class PlainDimension(object):
+    """`Dimension` as it was before using slots."""
+    name = None
+    value = None
+    values = None
+    dimensions = None
+
+
+    def __init__(self, name):
+        self.name = name
+        self.values = {}
+        self.dimensions = []
+
+
+def use(dataset, dimension, intern):
+    for module in (dsc_datatool.input.xml, dsc_datatool.input.dat):
+        module.Dataset = dataset
+        module.Dimension = dimension
+        module.intern = intern
+
+
+def measure(path):
+    if os.path.isdir(path):
+        input = dsc_datatool.input.dat.DAT()
+    else:
+        input = dsc_datatool.input.xml.XML()
+
+    tracemalloc.start()
+    datasets = input.process(path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del datasets
+    return current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Dataset and Dimension memory usage.')
+    parser.add_argument('path', nargs='*',
+        help='XML files or DAT directories.')
+    parser.add_argument('--subnets', type=int, default=0,
+        help='Also benchmark a synthetic XML file with this many client subnets.')
+    parser.add_argument('--lines', type=int, default=0,
+        help='Also benchmark synthetic DAT files with this many lines.')
+    args = parser.parse_args()
+
+    paths = list(args.path)
+    tmp_xml = None
+    tmp_dat = None
+    if args.subnets:
+        tmp_xml = xml_input.synthesize(args.subnets)
+        paths.append(tmp_xml)
+    if args.lines:
+        tmp_dat = dat_input.synthesize(args.lines, 100)
+        paths.append(tmp_dat)
+
+    try:
+        for path in paths:
+            print(path)
+            for name, dataset, dimension, func in (
+                    ('plain', PlainDataset, PlainDimension, str),
+                    ('slots', Dataset, Dimension, str),
+                    ('intern', Dataset, Dimension, intern)):
+                use(dataset, dimension, func)
+                current, peak = measure(path)
+                print('  %-6s %12.1f KiB held %12.1f KiB peak' % (name, current / 1024, peak / 1024))
+    finally:
+        use(Dataset, Dimension, intern)
+        if tmp_xml:
+            os.unlink(tmp_xml)
+        if tmp_dat:
+            shutil.rmtree(tmp_dat)
+
+
+if __name__ == '__main__':
+    main()
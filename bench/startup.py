@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare the startup time of `dsc-datatool` when only the plugins being
+used are imported against importing all plugins, as was done before.
+
+Each run is done in a new interpreter with `-X importtime`, reports the
+best wall time of the runs and the time spent importing modules, and the
+modules that took the longest to import for the last run:
+
+    PYTHONPATH=. python3 bench/startup.py
+    PYTHONPATH=. python3 bench/startup.py --runs 20 -- -s s -n n -o ';Prometheus;file=/dev/null' --xml tests/1563520620.dscdata.xml
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+# plugins must be imported after the arguments are parsed, so for eager
+# the first plugin looked up imports all of them
+_run = '''
+import sys
+import importlib
+import dsc_datatool
+if %r:
+    plugin = dsc_datatool._plugin
+    def eager(kind, name):
+        for k in dsc_datatool._plugins:
+            dsc_datatool._import_plugins(k)
+            for module in dsc_datatool._plugins[k].values():
+                importlib.import_module(module)
+        return plugin(kind, name)
+    dsc_datatool._plugin = eager
+    dsc_datatool._plugin_names = lambda kind: eager(kind, None) or dsc_datatool._registry[kind]
+sys.argv = [ 'dsc-datatool' ] + %r
+sys.exit(dsc_datatool.main())
+'''
+
+_importtime = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def run(argv, eager):
+    """Returns the wall time and the (cumulative us, module) of the modules
+    imported at top level."""
+    start = time.perf_counter()
+    p = subprocess.run([ sys.executable, '-X', 'importtime', '-c', _run % (eager, argv) ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, env=os.environ)
+    elapsed = time.perf_counter() - start
+    if p.returncode != 0:
+        raise Exception('dsc-datatool %s failed: %s' % (' '.join(argv), p.stderr))
+
+    modules = []
+    for line in p.stderr.splitlines():
+        m = _importtime.match(line)
+        if m and len(m.group(3)) == 1:
+            modules.append((int(m.group(2)), m.group(4)))
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dsc-datatool startup time.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=5,
+        help='Number of the slowest imports to show.')
+    parser.add_argument('argv', nargs='*',
+        help='Arguments to dsc-datatool, default to --list and a run with only the Prometheus output.')
+    args = parser.parse_args()
+
+    runs = [ args.argv ]
+    if not args.argv:
+        runs = [
+            [ '--list' ],
+            [ '-s', 's', '-n', 'n', '-o', ';Prometheus;file=%s' % os.devnull,
+              '--xml', os.path.join(os.path.dirname(__file__), '..', 'tests', '1563520620.dscdata.xml') ],
+        ]
+
+    for argv in runs:
+        print(' '.join(argv))
+        for name, eager in (('eager', True), ('lazy', False)):
+            best = None
+            for _ in range(args.runs):
+                elapsed, modules = run(argv, eager)
+                if best is None or elapsed < best:
+                    best = elapsed
+            modules.sort(reverse=True)
+            print('  %-6s %8.1f ms wall %8.1f ms importing' % (name, best * 1000, sum(us for us, module in modules) / 1000))
+            for us, module in modules[:args.top]:
+                print('         %8.1f ms %s' % (us / 1000, module))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Benchmark each input, transformer, generator and output on synthetic
+DSC data, see `synthetic.py`, and compare the results with a baseline.
+
+Each benchmark is run `--repeat` times on freshly read datasets and the
+best and median wall time is reported. The results can be saved as JSON
+and later runs compared with them, exiting with 1 if any benchmark is
+more than `--threshold` slower than in the baseline:
+
+    PYTHONPATH=. python3 bench/suite.py --save baseline.json
+    PYTHONPATH=. python3 bench/suite.py --compare baseline.json
+    PYTHONPATH=. python3 bench/suite.py --files 60 --subnets 50000 --only NetRemap --only InfluxDB
+
+client_subnet_country is only benchmarked if a MaxMind database is given
+with `--mmdb`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from dsc_datatool import args as dsc_args
+from dsc_datatool.input.xml import XML
+from dsc_datatool.input.dat import DAT
+
+import synthetic
+
+
+_tests = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests')
+
+
+def _read(xml):
+    datasets = []
+    for file in xml:
+        datasets += XML().process(file)
+    return datasets
+
+
+def benchmarks(opts, xml, dat):
+    """Returns [ (name, setup, run) ], `setup()` returns the argument for
+    `run()` which is the part that is timed."""
+    from dsc_datatool.transformer.labler import Labler
+    from dsc_datatool.transformer.net_remap import NetRemap
+    from dsc_datatool.transformer.re_ranger import ReRanger
+    from dsc_datatool.transformer.rollup import Rollup
+    from dsc_datatool.generator.client_subnet_authority import client_subnet_authority
+    from dsc_datatool.output.influxdb import InfluxDB
+    from dsc_datatool.output.prometheus import Prometheus
+
+    def read():
+        return _read(xml)
+
+    def named(*names):
+        return lambda: [ d for d in _read(xml) if d.name in names ]
+
+    def each(plugin):
+        return lambda datasets: [ plugin.process([ d ]) for d in datasets ]
+
+    def flush(plugin):
+        def run(datasets):
+            plugin.process(datasets)
+            plugin.flush()
+        return run
+
+    csv = [ os.path.join(_tests, 'ipv4-address-space.csv'), os.path.join(_tests, 'ipv6-unicast-address-assignments.csv') ]
+    ret = [
+        ('input/XML', lambda: xml, lambda files: [ XML().process(file) for file in files ]),
+        ('input/DAT', lambda: dat, lambda dir: DAT().process(dir)),
+        ('transformer/Labler', read, Labler({ 'yaml': os.path.join(_tests, 'labler.yaml') }).process),
+        ('transformer/NetRemap', named('client_subnet'), each(NetRemap({ 'net': '16' }))),
+        ('transformer/ReRanger', named('edns_bufsiz', 'client_port_range'), each(ReRanger({ 'key': 'low', 'range': '/4096' }))),
+        ('transformer/Rollup', read, flush(Rollup({ 'interval': '5m' }))),
+        ('generator/client_subnet_authority', named('client_subnet'), client_subnet_authority({ 'csv': csv }).process),
+        ('output/InfluxDB', read, InfluxDB({ 'file': os.devnull }).process),
+        ('output/Prometheus', read, Prometheus({ 'file': os.devnull }).process),
+    ]
+    if opts.mmdb:
+        from dsc_datatool.generator.client_subnet_country import client_subnet_country
+        ret.append(('generator/client_subnet_country', named('client_subnet'), client_subnet_country({ 'db': opts.mmdb }).process))
+    return ret
+
+
+def measure(setup, run, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        elapsed.append(time.perf_counter() - start)
+    elapsed.sort()
+    return {
+        'best': elapsed[0],
+        'median': elapsed[len(elapsed) // 2],
+        'runs': len(elapsed),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the results compared to the baseline, returns the names of the
+    benchmarks that are slower than the threshold allows."""
+    if results['params'] != baseline.get('params', None):
+        print('warning: the baseline was run with different parameters %r' % baseline.get('params', None))
+
+    slower = []
+    print('%-40s %12s %12s %8s' % ('benchmark', 'baseline ms', 'current ms', 'ratio'))
+    for name, result in results['results'].items():
+        base = baseline['results'].get(name, None)
+        if base is None:
+            print('%-40s %12s %12.3f' % (name, '-', result['best'] * 1000))
+            continue
+        ratio = result['best'] / base['best']
+        mark = ''
+        if ratio > 1 + threshold:
+            slower.append(name)
+            mark = ' REGRESSION'
+        print('%-40s %12.3f %12.3f %8.2f%s' % (name, base['best'] * 1000, result['best'] * 1000, ratio, mark))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dsc-datatool plugins.')
+    parser.add_argument('--files', type=int, default=10,
+        help='Number of synthetic XML files and lines in the DAT files.')
+    parser.add_argument('--datasets', type=int, default=10,
+        help='Number of datasets in each XML file.')
+    parser.add_argument('--keys', type=int, default=100,
+        help='Number of keys in each dimension.')
+    parser.add_argument('--subnets', type=int, default=1000,
+        help='Number of client subnets in the client_subnet dataset.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', action='append',
+        help='Only run benchmarks which name contains this, can be given multiple times.')
+    parser.add_argument('--mmdb',
+        help='MaxMind database to benchmark client_subnet_country with.')
+    parser.add_argument('--save',
+        help='Save the results as JSON to this file.')
+    parser.add_argument('--compare',
+        help='Compare the results with the JSON results in this file.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+        help='How much slower, as a fraction, than the baseline a benchmark may be.')
+    opts = parser.parse_args()
+
+    dsc_args.server = 'bench-server'
+    dsc_args.node = 'bench-node'
+    dsc_args.skipped_key = '-:SKIPPED:-'
+    dsc_args.skipped_sum_key = '-:SKIPPED_SUM:-'
+
+    params = {
+        'files': opts.files,
+        'datasets': opts.datasets,
+        'keys': opts.keys,
+        'subnets': opts.subnets,
+        'seed': opts.seed,
+    }
+    results = {
+        'params': params,
+        'python': platform.python_version(),
+        'results': {},
+    }
+
+    tmp = tempfile.mkdtemp()
+    try:
+        xml, dat = synthetic.generate(tmp, opts.files, opts.datasets, opts.keys, opts.subnets, opts.seed)
+        for name, setup, run in benchmarks(opts, xml, dat):
+            if opts.only and not any(only in name for only in opts.only):
+                continue
+            result = measure(setup, run, opts.repeat)
+            results['results'][name] = result
+            if not opts.compare:
+                print('%-40s %10.3f ms best %10.3f ms median' % (name, result['best'] * 1000, result['median'] * 1000))
+    finally:
+        shutil.rmtree(tmp)
+
+    if opts.save:
+        with open(opts.save, 'w') as f:
+            json.dump(results, f, indent=1)
+            f.write('\n')
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, opts.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Generate synthetic DSC data for benchmarks.
+
+Writes one XML file for each minute and a DAT directory with a line for
+each minute in its files. The data is random but the same for the same
+options and `--seed`:
+
+    PYTHONPATH=. python3 bench/synthetic.py /tmp/dsc
+    PYTHONPATH=. python3 bench/synthetic.py --files 60 --datasets 30 --keys 1000 --subnets 50000 /tmp/dsc
+
+The datasets are made after the ones DSC collects, with names and keys
+the transformers and generators can be used on. `--datasets` beyond
+those adds datasets named `synthetic<N>`, these only exist in the XML
+files.
+"""
+
+import argparse
+import os
+import random
+
+
+_start_time = 1563520560
+
+
+def _qtype(n, rng):
+    return str(n + 1)
+
+
+def _rcode(n, rng):
+    return str(n)
+
+
+def _bufsiz(n, rng):
+    return '%d-%d' % (n * 512, n * 512 + 511)
+
+
+def _port_range(n, rng):
+    return '%d-%d' % (n * 1024, n * 1024 + 1023)
+
+
+def _tld(n, rng):
+    return 'tld%d' % n
+
+
+def _key(n, rng):
+    return 'key%d' % n
+
+
+def _subnet(n, rng):
+    if n % 4:
+        return '%d.%d.%d.0' % (rng.randrange(1, 224), rng.randrange(256), rng.randrange(256))
+    return '2001:db8:%x:%x::' % (rng.randrange(65536), rng.randrange(65536))
+
+
+# name, first dimension, its keys or None for All, second dimension, its
+# keys and the DAT file it can be written to as 2 or 3 dimensions
+_datasets = [
+    ('qtype', 'All', None, 'Qtype', _qtype, 2),
+    ('rcode', 'All', None, 'Rcode', _rcode, 2),
+    ('client_subnet', 'All', None, 'ClientSubnet', _subnet, None),
+    ('edns_bufsiz', 'All', None, 'EDNSBufSiz', _bufsiz, 2),
+    ('client_port_range', 'All', None, 'PortRange', _port_range, 2),
+    ('qtype_vs_tld', 'Qtype', _qtype, 'TLD', _tld, None),
+    ('transport_vs_qtype', 'Transport', _key, 'Qtype', _qtype, 3),
+]
+
+
+def datasets(count):
+    """Returns the dataset definitions of `count` datasets."""
+    defs = _datasets[:count]
+    for n in range(len(defs), count):
+        defs.append(('synthetic%d' % n, 'All', None, 'Key', _key, None))
+    return defs
+
+
+def _values(d, keys, subnets, rng):
+    """Returns [ (first key, { second key: count }) ] for the dataset."""
+    name, first, first_keys, second, second_keys, dat = d
+    if second_keys is _subnet:
+        keys = subnets
+    if first_keys is None:
+        return [ ('ALL', { second_keys(n, rng): rng.randrange(1, 1000) for n in range(keys) }) ]
+    return [ (first_keys(n, rng), { second_keys(k, rng): rng.randrange(1, 1000) for k in range(max(keys // 10, 1)) }) for n in range(10) ]
+
+
+def write_xml(file, start_time, defs, keys, subnets, rng):
+    with open(file, 'w') as f:
+        f.write('<dscdata>\n')
+        for d in defs:
+            name, first, first_keys, second = d[:4]
+            f.write('<array name="%s" dimensions="2" start_time="%d" stop_time="%d">\n' % (name, start_time, start_time + 60))
+            f.write('  <dimension number="1" type="%s"/>\n  <dimension number="2" type="%s"/>\n  <data>\n' % (first, second))
+            for k1, values in _values(d, keys, subnets, rng):
+                f.write('    <%s val="%s">\n' % (first, k1))
+                for k2, v in values.items():
+                    f.write('      <%s val="%s" count="%d"/>\n' % (second, k2, v))
+                f.write('    </%s>\n' % first)
+            f.write('  </data>\n</array>\n')
+        f.write('</dscdata>\n')
+
+
+def write_dat(dir, start_time, lines, defs, keys, subnets, rng):
+    os.makedirs(dir, exist_ok=True)
+    for d in defs:
+        if d[5] is None:
+            continue
+        with open(os.path.join(dir, '%s.dat' % d[0]), 'w') as f:
+            for n in range(lines):
+                values = _values(d, keys, subnets, rng)
+                if d[5] == 2:
+                    line = ' '.join('%s %d' % kv for kv in values[0][1].items())
+                else:
+                    line = ' '.join('%s %s' % (k1, ':'.join('%s:%d' % kv for kv in v.items())) for k1, v in values)
+                f.write('%d %s\n' % (start_time + n * 60, line))
+
+
+def generate(dir, files=10, count=10, keys=100, subnets=1000, seed=0):
+    """Generate `files` XML files and a DAT directory with as many lines in
+    `dir`, returns the list of XML files and the DAT directory."""
+    rng = random.Random(seed)
+    defs = datasets(count)
+    os.makedirs(dir, exist_ok=True)
+    xml = []
+    for n in range(files):
+        start_time = _start_time + n * 60
+        file = os.path.join(dir, '%d.dscdata.xml' % (start_time + 60))
+        write_xml(file, start_time, defs, keys, subnets, rng)
+        xml.append(file)
+    dat = os.path.join(dir, 'dat')
+    write_dat(dat, _start_time, files, defs, keys, subnets, rng)
+    return xml, dat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic DSC XML and DAT data.')
+    parser.add_argument('dir',
+        help='Directory to write the XML files and the DAT directory "dat" to.')
+    parser.add_argument('--files', type=int, default=10,
+        help='Number of XML files and lines in the DAT files, one per minute.')
+    parser.add_argument('--datasets', type=int, default=10,
+        help='Number of datasets in each XML file.')
+    parser.add_argument('--keys', type=int, default=100,
+        help='Number of keys in each dimension.')
+    parser.add_argument('--subnets', type=int, default=1000,
+        help='Number of client subnets in the client_subnet dataset.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    xml, dat = generate(args.dir, args.files, args.datasets, args.keys, args.subnets, args.seed)
+    print('%d XML files and DAT directory %s' % (len(xml), dat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Compare the ReRanger and NetRemap transformers against their previous
+implementations, which parsed every key in every interval.
+
+Reports the wall time of each interval for a wide synthetic `edns_bufsiz`
+dataset and a `client_subnet` dataset with many IPv4 and IPv6 addresses:
+
+    PYTHONPATH=. python3 bench/transformers.py
+    PYTHONPATH=. python3 bench/transformers.py --subnets 200000 --intervals 10
+"""
+
+import argparse
+import ipaddress
+import random
+import re
+import time
+
+from dsc_datatool import Dataset, Dimension, args
+from dsc_datatool.transformer.re_ranger import ReRanger
+from dsc_datatool.transformer.net_remap import NetRemap
+
+
+_key_re = re.compile(r'^(?:(\d+)|(\d+)-(\d+))$')
+
+
+class PlainReRanger(ReRanger):
+    """`ReRanger._process()` as it was before caching the new keys."""
+
+
+    def _process(self, dimension):
+        if not dimension.values:
+            for d2 in dimension.dimensions:
+                self._process(d2)
+            return
+
+        values = dimension.values
+        dimension.values = {}
+        skipped = None
+
+        for k, v in values.items():
+            low = None
+            high = None
+
+            m = _key_re.match(k)
+            if m:
+                low, low2, high = m.group(1, 2, 3)
+                if high is None:
+                    low = int(low)
+                    high = low
+                else:
+                    low = int(low2)
+                    high = int(high)
+            elif k == args.skipped_key:
+                continue
+            elif k == args.skipped_sum_key:
+                if skipped is None:
+                    skipped = v
+                else:
+                    skipped += v
+                continue
+            elif self.allow_invalid_keys:
+                dimension.values[k] = v
+                continue
+            else:
+                raise Exception('invalid key %r' % k)
+
+            if self.key == 'low':
+                nkey = low
+            elif self.key == 'mid':
+                nkey = int(low + ( (high - low) / 2 ))
+            else:
+                nkey = high
+
+            nkey = int(nkey / self.split_by) * self.split_by
+            low = nkey
+            high = nkey + self.split_by - 1
+
+            if low != high:
+                nkey = '%d-%d' % (low, high)
+            else:
+                nkey = str(nkey)
+
+            if nkey in dimension.values:
+                dimension.values[nkey] += v
+            else:
+                dimension.values[nkey] = v
+
+        if skipped:
+            dimension.values['skipped'] = skipped
+
+
+class PlainNetRemap(NetRemap):
+    """`NetRemap._process()` as it was before caching the new keys."""
+
+
+    def _process(self, dimension):
+        if not dimension.values:
+            for d2 in dimension.dimensions:
+                self._process(d2)
+            return
+
+        values = dimension.values
+        dimension.values = {}
+
+        for k, v in values.items():
+            if k == args.skipped_key:
+                continue
+            elif k == args.skipped_sum_key:
+                dimension.values['0'] = v
+                continue
+
+            try:
+                ip = ipaddress.ip_address(k)
+            except Exception as e:
+                if not self.nonstrict:
+                    raise e
+                continue
+            if ip.version == 4:
+                nkey = str(ipaddress.IPv4Network('%s/%s' % (ip, self.v4net), strict=False).network_address)
+            else:
+                nkey = str(ipaddress.IPv6Network('%s/%s' % (ip, self.v6net), strict=False).network_address)
+
+            if not nkey in dimension.values:
+                dimension.values[nkey] = v
+            else:
+                dimension.values[nkey] += v
+
+
+def dataset(name, values):
+    dataset = Dataset()
+    dataset.name = name
+    d1 = Dimension('All')
+    d1.value = 'ALL'
+    dataset.dimensions.append(d1)
+    d2 = Dimension(name)
+    d2.values = dict(values)
+    d1.dimensions.append(d2)
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ReRanger and NetRemap.')
+    parser.add_argument('--subnets', type=int, default=50000,
+        help='Number of client subnets in the synthetic client_subnet dataset.')
+    parser.add_argument('--intervals', type=int, default=5,
+        help='Number of intervals to transform.')
+    opts = parser.parse_args()
+
+    args.skipped_key = '-:SKIPPED:-'
+    args.skipped_sum_key = '-:SKIPPED_SUM:-'
+
+    random.seed(0)
+    bufsiz = { str(n): n % 7 + 1 for n in range(65536) }
+    subnets = {}
+    for n in range(opts.subnets):
+        if n % 4:
+            subnets['%d.%d.%d.%d' % tuple(random.randrange(256) for _ in range(4))] = n % 13 + 1
+        else:
+            subnets['2001:db8:%x:%x::%x' % (random.randrange(65536), random.randrange(65536), random.randrange(65536))] = n % 13 + 1
+
+    for name, values, transformers in (
+            ('edns_bufsiz', bufsiz, (('plain', PlainReRanger), ('cached', ReRanger)), ),
+            ('client_subnet', subnets, (('plain', PlainNetRemap), ('cached', NetRemap)), )):
+        print('%s (%d keys)' % (name, len(values)))
+        for label, cls in transformers:
+            if cls in (ReRanger, PlainReRanger):
+                transformer = cls({ 'key': 'low', 'range': '/512' })
+            else:
+                transformer = cls({ 'net': '16' })
+            elapsed = []
+            for _ in range(opts.intervals):
+                datasets = [ dataset(name, values) ]
+                start = time.perf_counter()
+                transformer.process(datasets)
+                elapsed.append(time.perf_counter() - start)
+            print('  %-7s %s ms' % (label, ' '.join('%8.1f' % (e * 1000) for e in elapsed)))
+
+
+if __name__ == '__main__':
+    main()
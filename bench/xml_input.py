@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Compare the streaming XML input against the previous minidom parser.
+
+Reports wall time and peak traced memory for both parsers, optionally
+on a synthetic file with a large `client_subnet` array, and for the
+streaming parser when only some datasets are selected:
+
+    PYTHONPATH=. python3 bench/xml_input.py tests/1563520620.dscdata.xml
+    PYTHONPATH=. python3 bench/xml_input.py --subnets 200000 --dataset qtype
+"""
+
+import argparse
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+from xml.dom import minidom
+
+from dsc_datatool import Dataset, Dimension, process_dataset
+from dsc_datatool.input.xml import XML
+
+
+def minidom_process(file):
+    """The minidom based `XML.process()` as it was before streaming."""
+    dom = minidom.parse(file)
+    datasets = []
+    for array in dom.getElementsByTagName('array'):
+        dataset = Dataset()
+        dataset.name = array.getAttribute('name')
+        dataset.start_time = int(array.getAttribute('start_time'))
+        dataset.stop_time = int(array.getAttribute('stop_time'))
+
+        dimensions = [None, None]
+        for dimension in array.getElementsByTagName('dimension'):
+            if dimension.getAttribute('number') == '1':
+                dimensions[0] = dimension.getAttribute('type')
+            elif dimension.getAttribute('number') == '2':
+                dimensions[1] = dimension.getAttribute('type')
+
+        for node1 in array.getElementsByTagName(dimensions[0]):
+            d1 = Dimension(dimensions[0])
+            d1.value = node1.getAttribute('val')
+            try:
+                if node1.getAttribute('base64'):
+                    d1.value = base64.b64decode(d1.value).decode('utf-8')
+            except Exception as e:
+                pass
+            dataset.dimensions.append(d1)
+
+            d2 = Dimension(dimensions[1])
+            d1.dimensions.append(d2)
+            for node2 in node1.getElementsByTagName(dimensions[1]):
+                val = node2.getAttribute('val')
+                try:
+                    if node2.getAttribute('base64'):
+                        val = base64.b64decode(val).decode('utf-8')
+                except Exception as e:
+                    pass
+                d2.values[val] = int(node2.getAttribute('count'))
+
+        datasets.append(dataset)
+
+    return datasets
+
+
+def synthesize(subnets):
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    with os.fdopen(fd, 'w') as f:
+        f.write('<dscdata>\n<array name="client_subnet" dimensions="2" start_time="1563520560" stop_time="1563520620">\n')
+        f.write('  <dimension number="1" type="ClientSubnet"/>\n  <dimension number="2" type="Rcode"/>\n  <data>\n')
+        for n in range(subnets):
+            f.write('    <ClientSubnet val="10.%d.%d.0">\n' % ((n >> 8) & 255, n & 255))
+            f.write('      <Rcode val="0" count="%d"/>\n      <Rcode val="3" count="1"/>\n' % (n % 97))
+            f.write('    </ClientSubnet>\n')
+        f.write('  </data>\n</array>\n')
+        f.write('<array name="qtype" dimensions="2" start_time="1563520560" stop_time="1563520620">\n')
+        f.write('  <dimension number="1" type="All"/>\n  <dimension number="2" type="Qtype"/>\n  <data>\n')
+        f.write('    <All val="ALL">\n      <Qtype val="1" count="%d"/>\n    </All>\n' % subnets)
+        f.write('  </data>\n</array>\n</dscdata>\n')
+    return path
+
+
+def measure(func, file, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    tracemalloc.start()
+    func(file)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark XML input parsers.')
+    parser.add_argument('file', nargs='*')
+    parser.add_argument('--subnets', type=int, default=0,
+        help='Also benchmark a synthetic file with this many client subnets.')
+    parser.add_argument('--dataset', action='append',
+        help='Also benchmark the streaming parser only selecting these datasets.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = list(args.file)
+    tmp = None
+    if args.subnets:
+        tmp = synthesize(args.subnets)
+        files.append(tmp)
+
+    xml = XML()
+    try:
+        for file in files:
+            print('%s (%d bytes)' % (file, os.path.getsize(file)))
+            for name, func in (('minidom', minidom_process), ('expat', xml.process)):
+                elapsed, peak = measure(func, file, args.repeat)
+                print('  %-8s %10.3f ms %12.1f KiB peak' % (name, elapsed * 1000, peak / 1024))
+            if args.dataset:
+                process_dataset.update({ name: True for name in args.dataset })
+                elapsed, peak = measure(xml.process, file, args.repeat)
+                process_dataset.clear()
+                print('  %-8s %10.3f ms %12.1f KiB peak (--dataset %s)' % ('expat', elapsed * 1000, peak / 1024, ','.join(args.dataset)))
+    finally:
+        if tmp:
+            os.unlink(tmp)
+
+
+if __name__ == '__main__':
+    main()
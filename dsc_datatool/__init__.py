@@ -3,7 +3,9 @@
 The main Python module for the command line tool `dsc-datatool`, see
 `man dsc-datatool` on how to run it.
 
-On runtime it will load all plugins under the following module path:
+On runtime it will load the plugins being used from the following module
+paths, the plugins that comes with dsc_datatool are listed in `_plugins`
+and other modules are only loaded when a plugin is not found there:
 - dsc_datatool.input
 - dsc_datatool.output
 - dsc_datatool.generator
@@ -35,22 +37,105 @@ Example of an output:
 __version__ = '1.4.2'
 
 import argparse
+import functools
 import logging
 import os
 import importlib
-import pkgutil
 import sys
 import traceback
 import re
+import time
+import types
 
 args = argparse.Namespace()
 inputs = {}
 outputs = {}
 generators = {}
 transformers = {}
+
+# the plugins that comes with dsc_datatool and the module they are in
+_plugins = {
+    'input': {
+        'DAT': 'dsc_datatool.input.dat',
+        'XML': 'dsc_datatool.input.xml',
+    },
+    'output': {
+        'InfluxDB': 'dsc_datatool.output.influxdb',
+        'Prometheus': 'dsc_datatool.output.prometheus',
+    },
+    'generator': {
+        'client_subnet_authority': 'dsc_datatool.generator.client_subnet_authority',
+        'client_subnet_country': 'dsc_datatool.generator.client_subnet_country',
+    },
+    'transformer': {
+        'Labler': 'dsc_datatool.transformer.labler',
+        'NetRemap': 'dsc_datatool.transformer.net_remap',
+        'ReRanger': 'dsc_datatool.transformer.re_ranger',
+        'Rollup': 'dsc_datatool.transformer.rollup',
+    },
+}
 process_dataset = {}
+time_range = {}
 encoding = 'utf-8'
 
+_compression = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'lzma',
+}
+
+
+def open_file(file, fileobj=None):
+    """open_file(file[, fileobj]) -> file object
+
+    Open `file` for reading in binary mode, if the filename ends with .gz,
+    .bz2 or .xz then it will be decompressed while reading.
+    If `fileobj` is given then that is read instead and `file` is only
+    used to detect the compression."""
+    ext = os.path.splitext(file)[1].lower()
+    if ext in _compression:
+        return importlib.import_module(_compression[ext]).open(fileobj or file, 'rb')
+    if fileobj:
+        return fileobj
+    return open(file, 'rb')
+
+
+def node_of(dataset):
+    """node_of(dataset) -> str
+
+    Returns the node of the `Dataset`, outputs should use this instead of
+    `args.node`."""
+    return dataset.node or args.node
+
+
+_intern_size = 65536
+_interned = {}
+
+
+def intern(value):
+    """intern(value) -> value
+
+    Returns a shared copy of the string `value` so that names and keys
+    that repeats in every interval and file are only kept once in memory.
+    The table is emptied when it reaches 65536 strings so that sets of
+    unique values, like qnames, can not grow it without limit."""
+    if len(_interned) >= _intern_size:
+        _interned.clear()
+    return _interned.setdefault(value, value)
+
+
+def in_time_range(start_time, stop_time):
+    """in_time_range(start_time, stop_time) -> bool
+
+    Returns True if the interval `start_time` to `stop_time` is within the
+    time range given with `--start` and `--stop`, as in starting at or
+    after `time_range['start']` and ending at or before `time_range['stop']`."""
+    if 'start' in time_range and start_time < time_range['start']:
+        return False
+    if 'stop' in time_range and stop_time > time_range['stop']:
+        return False
+    return True
+
 
 class Dataset(object):
     """A representation of a DSC dataset
@@ -77,21 +162,34 @@ class Dataset(object):
     - start_time: The start time of the dataset in seconds
     - stop_time: The stop time of the dataset in seconds
     - dimensions: An array with `Dimension`, the first dimension
+    - node: The node the dataset is from if it's not the one given with
+      `--node`, see `node_of()`
     """
-    name = None
-    start_time = None
-    stop_time = None
-    dimensions = None
+    __slots__ = ('name', 'start_time', 'stop_time', 'dimensions', 'node')
 
 
     def __init__(self):
+        self.name = None
+        self.start_time = None
+        self.stop_time = None
         self.dimensions = []
+        self.node = None
+
+
+    def merge(self, dataset):
+        """Add the counters of `dataset` to this dataset, dimensions are
+        matched on their name and value and the values are summed per key."""
+        _merge_dimensions(self.dimensions, dataset.dimensions)
 
 
     def __repr__(self):
         return '<Dataset name=%r dimension=%r>' % (self.name, self.dimensions)
 
 
+_no_values = types.MappingProxyType({})
+_no_dimensions = ()
+
+
 class Dimension(object):
     """A representation of a DSC dimension
 
@@ -102,21 +200,78 @@ class Dimension(object):
     - name: The name of the dimension
     - value: Is set to the value of the dimension if it's the first dimension
     - values: A dict of values with corresponding counters if it's the second dimension
+    - dimensions: An array with `Dimension`, the second dimension, if it's the first dimension
+
+    Since a dimension only uses one of `values` and `dimensions` they are
+    allocated when first used, reading one of them while the other is not
+    empty gives an empty read-only placeholder instead.
     """
-    name = None
-    value = None
-    values = None
-    dimensions = None
+    __slots__ = ('name', 'value', '_values', '_dimensions')
 
 
     def __init__(self, name):
         self.name = name
-        self.values = {}
-        self.dimensions = []
+        self.value = None
+        self._values = None
+        self._dimensions = None
+
+
+    @property
+    def values(self):
+        if self._values is None:
+            if self._dimensions:
+                return _no_values
+            self._values = {}
+        return self._values
+
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+
+
+    @property
+    def dimensions(self):
+        if self._dimensions is None:
+            if self._values:
+                return _no_dimensions
+            self._dimensions = []
+        return self._dimensions
+
+
+    @dimensions.setter
+    def dimensions(self, dimensions):
+        self._dimensions = dimensions
+
+
+    def merge(self, dimension):
+        """Add the counters of `dimension` to this dimension, see
+        `Dataset.merge()`."""
+        if dimension._values:
+            values = self.values
+            for k, v in dimension._values.items():
+                if k in values:
+                    values[k] += v
+                else:
+                    values[k] = v
+        if dimension._dimensions:
+            _merge_dimensions(self.dimensions, dimension._dimensions)
 
 
     def __repr__(self):
-        return '<Dimension name=%r value=%r dimension=%r>' % (self.name, self.values or self.value, self.dimensions)
+        return '<Dimension name=%r value=%r dimension=%r>' % (self.name, self._values or self.value, self._dimensions or [])
+
+
+def _merge_dimensions(dimensions, others):
+    index = { (d.name, d.value): d for d in dimensions }
+    for other in others:
+        d = index.get((other.name, other.value), None)
+        if d is None:
+            d = Dimension(other.name)
+            d.value = other.value
+            dimensions.append(d)
+            index[(d.name, d.value)] = d
+        d.merge(other)
 
 
 class Input(object):
@@ -131,6 +286,15 @@ class Input(object):
         raise Exception('process() not overloaded')
 
 
+    def stream(self, file):
+        """Input.stream(...) -> generator of [ Dataset, ... ]
+
+        Called to process a file and yield the `Dataset`'s found in it in
+        batches, by default all are yielded at once from `process()`.
+        """
+        yield self.process(file)
+
+
     def __init_subclass__(cls):
         """This method is called when a class is subclassed and it will
         register the input plugin in `inputs`."""
@@ -168,6 +332,105 @@ class Output(object):
         outputs[cls.__name__] = cls
 
 
+def labeled_values(dimensions, label, labels=''):
+    """labeled_values([ Dimension, ... ], label) -> generator of (labels, Dimension)
+
+    Walks the dimensions of a `Dataset` and yields each dimension that has
+    values together with the labels of the dimensions above it, for the
+    outputs. `label(name, value)` is called to get the label of each
+    dimension, other than the All dimension, and its result is added to
+    the labels of those above it."""
+    for dimension in dimensions:
+        if dimension.dimensions:
+            if dimension.name == 'All' and dimension.value == 'ALL':
+                yield from labeled_values(dimension.dimensions, label, labels)
+            else:
+                yield from labeled_values(dimension.dimensions, label, labels + label(dimension.name, dimension.value))
+        elif dimension.values:
+            yield labels, dimension
+
+
+class LineBuffer(object):
+    """LineBuffer(fh) -> instance
+
+    Collects the lines of an output so they are written to the file object
+    with one `write()` once `size` lines has been collected or when
+    `flush()` is called."""
+    __slots__ = ('fh', 'size', 'lines')
+
+
+    def __init__(self, fh, size=65536):
+        self.fh = fh
+        self.size = size
+        self.lines = []
+
+
+    def extend(self, lines):
+        self.lines += lines
+        if len(self.lines) >= self.size:
+            self.flush()
+
+
+    def append(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.size:
+            self.flush()
+
+
+    def flush(self):
+        if self.lines:
+            self.lines.append('')
+            self.fh.write('\n'.join(self.lines))
+            self.lines = []
+
+
+class Escaper(object):
+    """Escaper(chars, quote='%s') -> instance
+
+    Escapes the names and keys of datasets for an output by putting a
+    backslash before each character matched by the regular expression
+    `chars`. Names and keys repeat in every interval so the escaped forms
+    are cached, up to `cache_size` of each.
+
+    Attributes:
+    - key(key): The escaped key
+    - value(value): The escaped value formatted with `quote`, or `""` if empty
+    - name(name): The escaped lower case name
+    - label(name, value): The label `,<name>=<value>` of a dimension
+    """
+    __slots__ = ('key', 'value', 'name', 'label')
+    cache_size = 65536
+
+
+    def __init__(self, chars, quote='%s'):
+        regex = re.compile('(%s)' % chars)
+
+        def key(key):
+            if regex.search(key) is None:
+                return key
+            return regex.sub(r'\\\1', key)
+
+        @functools.lru_cache(maxsize=self.cache_size)
+        def value(value):
+            ret = key(value)
+            if ret == '':
+                return '""'
+            return quote % ret
+
+        @functools.lru_cache(maxsize=self.cache_size)
+        def name(name):
+            return key(name.lower())
+
+        @functools.lru_cache(maxsize=self.cache_size)
+        def label(name_, value_):
+            return ',%s=%s' % (name(name_), value(value_))
+
+        self.key = key
+        self.value = value
+        self.name = name
+        self.label = label
+
+
 class Generator(object):
     """Base class of a generator plugin"""
 
@@ -205,10 +468,20 @@ class Transformer(object):
         """Transformer.process([ Dataset, ... ])
 
         Called to do transformation of the given `Dataset`'s, as in modifying
-        them directly."""
+        them directly. The list itself may also be changed to replace or
+        remove `Dataset`'s."""
         raise Exception('process() not overloaded')
 
 
+    def flush(self):
+        """Transformer.flush() -> [ Dataset, ... ]
+
+        Called at the end of a run, a transformer that holds back `Dataset`'s
+        between calls to `process()` should return them here so they can
+        continue through the rest of the transformers and the outputs."""
+        return []
+
+
     def __init__(self, opts):
         """instance = Transformer({ 'opt': value, ... })
 
@@ -226,12 +499,1092 @@ class Transformer(object):
         transformers[cls.__name__] = cls
 
 
-def main():
-    """Called when running `dsc-datatool`."""
-    def iter_namespace(ns_pkg):
-        return pkgutil.iter_modules(ns_pkg.__path__, ns_pkg.__name__ + ".")
+_registry = {
+    'input': inputs,
+    'output': outputs,
+    'generator': generators,
+    'transformer': transformers,
+}
+
+
+def _import_plugins(kind):
+    """Import the modules under the module path of the `kind` of plugins
+    that are not listed in `_plugins`, these are plugins not coming with
+    dsc_datatool."""
+    import pkgutil
+
+    package = importlib.import_module('dsc_datatool.%s' % kind)
+    known = _plugins[kind].values()
+    for finder, name, ispkg in pkgutil.iter_modules(package.__path__, package.__name__ + '.'):
+        if not name in known:
+            importlib.import_module(name)
+
+
+def _plugin(kind, name):
+    """Returns the class of the `kind` of plugin with the given name, its
+    module is imported if it has not been already. Returns None if there
+    is no such plugin."""
+    registry = _registry[kind]
+    if not name in registry:
+        if name in _plugins[kind]:
+            importlib.import_module(_plugins[kind][name])
+        else:
+            _import_plugins(kind)
+    return registry.get(name, None)
+
+
+def _plugin_names(kind):
+    """Returns the names of all plugins of `kind`, for `--list`, only the
+    modules of plugins not coming with dsc_datatool are imported."""
+    _import_plugins(kind)
+    return list(_plugins[kind]) + [ name for name in _registry[kind] if not name in _plugins[kind] ]
+
+
+def _generate(datasets, generators):
+    gen_datasets = []
+    for generator in generators:
+        try:
+            started = _stats and _stats.start()
+            generated = generator.process(datasets)
+            if _stats:
+                _stats.add(generator, started, generated)
+            gen_datasets += generated
+        except Exception as e:
+            logging.warning('Generator %s failed: %s' % (generator, e))
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            for tb in traceback.format_tb(exc_traceback):
+                logging.warning(str(tb))
+            return 2
+
+    if datasets:
+        # generated datasets are from the node of the datasets they are
+        # generated from
+        for dataset in gen_datasets:
+            if dataset.node is None:
+                dataset.node = datasets[0].node
+    datasets += gen_datasets
+
+    return 0
+
+
+def _transform(datasets, generators, transformers):
+    ret = _generate(datasets, generators)
+    if ret > 0:
+        return ret
+
+    if '*' in transformers:
+        for transformer in transformers['*']:
+            try:
+                started = _stats and _stats.start()
+                transformer.process(datasets)
+                if _stats:
+                    _stats.add(transformer, started, datasets)
+            except Exception as e:
+                logging.warning('Transformer %s failed: %s' % (transformer, e))
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                for tb in traceback.format_tb(exc_traceback):
+                    logging.warning(str(tb))
+                return 2
+    transformed = []
+    for dataset in datasets:
+        if not dataset.name in transformers:
+            transformed.append(dataset)
+            continue
+        selected = [ dataset ]
+        for transformer in transformers[dataset.name]:
+            try:
+                started = _stats and _stats.start()
+                transformer.process(selected)
+                if _stats:
+                    _stats.add(transformer, started, selected)
+            except Exception as e:
+                logging.warning('Transformer %s failed: %s' % (transformer, e))
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                for tb in traceback.format_tb(exc_traceback):
+                    logging.warning(str(tb))
+                return 2
+        transformed += selected
+    datasets[:] = transformed
+
+    return 0
+
+
+def _write(datasets, outputs):
+    for output in outputs:
+        try:
+            started = _stats and _stats.start()
+            output.process(datasets)
+            if _stats:
+                _stats.add(output, started, datasets)
+        except Exception as e:
+            logging.warning('Output %s failed: %s' % (output, e))
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            for tb in traceback.format_tb(exc_traceback):
+                logging.warning(str(tb))
+            return 2
+
+    return 0
+
+
+_aggregate = None
+_stats = None
+
+
+def _output(datasets, outputs):
+    """Output the `Dataset`'s and, with `--aggregate-node`, the merged
+    `Dataset`'s that are complete after adding these."""
+    ret = _write(datasets, outputs)
+    if ret > 0 or _aggregate is None:
+        return ret
+
+    return _write(_aggregate.process(datasets), outputs)
+
+
+def _process(datasets, generators, transformers, outputs):
+    ret = _transform(datasets, generators, transformers)
+    if ret > 0:
+        return ret
+
+    return _output(datasets, outputs)
+
+
+def _finish(transformers, outputs):
+    """Called at the end of a run to get the `Dataset`'s transformers have
+    held back, they are given to the transformers after it and outputted.
+    Lastly the merged `Dataset`'s for `--aggregate-node` that are still
+    waiting for some node are outputted and the outputs are flushed."""
+    names = [ '*' ] + [ name for name in transformers if name != '*' ]
+    for name in names:
+        chain = transformers.get(name, [])
+        for n, transformer in enumerate(chain):
+            try:
+                started = _stats and _stats.start()
+                datasets = transformer.flush()
+                if _stats:
+                    _stats.add(transformer, started, datasets or [])
+            except Exception as e:
+                logging.warning('Transformer %s failed: %s' % (transformer, e))
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                for tb in traceback.format_tb(exc_traceback):
+                    logging.warning(str(tb))
+                return 2
+            if not datasets:
+                continue
+
+            rest = { name: chain[n + 1:] }
+            if name == '*':
+                rest.update({ k: v for k, v in transformers.items() if k != '*' })
+            ret = _transform(datasets, [], rest)
+            if ret > 0:
+                return ret
+            ret = _output(datasets, outputs)
+            if ret > 0:
+                return ret
+
+    if _aggregate is not None:
+        ret = _write(_aggregate.flush(), outputs)
+        if ret > 0:
+            return ret
+
+    return _flush(outputs)
+
+
+def _holds_back(transformers):
+    """Returns the transformers that holds back `Dataset`'s between runs
+    of `process()`."""
+    return [ transformer for chain in transformers.values() for transformer in chain
+        if type(transformer).flush is not Transformer.flush ]
+
+
+def _holding(transformers):
+    """Returns True if `Dataset`'s can be held back until `_finish()`, by
+    transformers or for `--aggregate-node`. The `--state` must then not be
+    saved until they have been outputted since the input they are from is
+    recorded as done."""
+    return _aggregate is not None or len(_holds_back(transformers)) > 0
+
+
+_load_error = {
+    'XML': 'Unable to process XML file %s: %s',
+    'DAT': 'Unable to process DAT files in %s: %s',
+}
+
+_tar_ext = ( '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz' )
+
+
+def _is_tar(file):
+    return file.lower().endswith(_tar_ext)
+
+
+def _tar_members(file):
+    """Yields the name and an opened file object for each XML file in the
+    tar archive, the archive is read as a stream."""
+    import tarfile
+
+    with tarfile.open(file, 'r|*') as tar:
+        for member in tar:
+            name = os.path.basename(member.name)
+            if not member.isfile() or name.startswith('.') or not _strip_compression(name.lower()).endswith('.xml'):
+                continue
+            if not _xml_in_time_range(name):
+                logging.debug('Skipping XML file %s:%s outside of the time range' % (file, member.name))
+                continue
+            yield '%s:%s' % (file, member.name), open_file(member.name, tar.extractfile(member))
+
+
+def _tag(datasets, node):
+    if node is not None:
+        for dataset in datasets:
+            dataset.node = node
+    return datasets
+
+
+def _load(item):
+    """_load((input, path, pos)) -> generator of (ret, [ Dataset, ... ])
+
+    Process `path` with the given input plugin, errors are logged and
+    returned as exit code 1. Tar archives given to the XML input yields
+    the datasets of each XML file in it, otherwise the batches from the
+    input's `stream()` are yielded, for DAT that is one per interval.
+
+    `pos` is the position in the input to record in the `--state` once
+    the datasets has been outputted, for XML it's the stat of the file
+    and for DAT it's the offsets of the files which the input updates.
+
+    `node` is set on the datasets if the input is from another node than
+    the one given with `--node`."""
+    input, path, pos, node = item
+    try:
+        plugin = _plugin('input', input)()
+        if input == 'DAT' and pos is not None:
+            plugin.offsets = pos
+        if input == 'XML' and _is_tar(path):
+            for name, file in _tar_members(path):
+                with file:
+                    try:
+                        started = _stats and _stats.start()
+                        datasets = plugin.process(file)
+                        if _stats:
+                            _stats.add(plugin, started, datasets, name)
+                    except Exception as e:
+                        logging.critical(_load_error[input] % (name, e))
+                        yield 1, None
+                        return
+                yield 0, _tag(datasets, node)
+            return
+        stream = plugin.stream(path)
+        while True:
+            started = _stats and _stats.start()
+            datasets = next(stream, None)
+            if datasets is None:
+                break
+            if _stats:
+                _stats.add(plugin, started, datasets, path)
+            yield 0, _tag(datasets, node)
+    except Exception as e:
+        logging.critical(_load_error[input] % (path, e))
+        yield 1, None
+
+
+_worker_chain = None
+
+
+def _work(item):
+    """Called in the worker processes for `--jobs`, the generators and
+    transformers are inherited from the parent in `_worker_chain`.
+    Returns the result of each set of datasets and the position."""
+    gens, trans = _worker_chain
+    results = []
+    for ret, datasets in _load(item):
+        if ret == 0:
+            ret = _transform(datasets, gens, trans)
+        results.append((ret, datasets))
+        if ret > 0:
+            break
+    return results, item[2]
+
+
+def _run_jobs(items, gens, trans, out, jobs, state, batch):
+    """Parse and transform `items` in `jobs` worker processes while the
+    outputs are done here in the same order as `items`, in batches as
+    given by `batch`, see `_Batch`."""
+    global _worker_chain
+    import multiprocessing
+
+    if not 'fork' in multiprocessing.get_all_start_methods():
+        logging.critical('--jobs is not supported on this platform')
+        return 1
+
+    batch = _Batch(lambda datasets: _output(datasets, out), state, *batch)
+    _worker_chain = (gens, trans)
+    with multiprocessing.get_context('fork').Pool(jobs) as pool:
+        for item, (results, pos) in zip(items, pool.imap(_work, items)):
+            for ret, datasets in results:
+                if ret > 0:
+                    return ret
+
+                ret = batch.add(datasets)
+                if ret > 0:
+                    return ret
+
+            batch.done(item[0], item[1], pos)
+
+    return batch.flush()
+
+
+def _run(items, gens, trans, out, state, batch):
+    """Process `items` one after the other, the outputs are done in batches
+    as given by `batch`, see `_Batch`."""
+    # generators are run for each input so generated datasets follow
+    # the datasets they are generated from, and are from their node
+    batch = _Batch(lambda datasets: _process(datasets, [], trans, out), state, *batch)
+    for item in items:
+        for ret, datasets in _load(item):
+            if ret > 0:
+                return ret
 
+            ret = _generate(datasets, gens)
+            if ret > 0:
+                return ret
 
+            ret = batch.add(datasets)
+            if ret > 0:
+                return ret
+
+        batch.done(item[0], item[1], item[2])
+
+    return batch.flush()
+
+
+def _pipeline(items, gens, trans, out, state, batch, queue_size):
+    """Process `items` in three stages, each in its own thread, connected
+    with queues of at most `queue_size` entries so the next input is read
+    while the current one is transformed and outputted.
+
+    The input stage loads the items, the second stage runs the generators
+    and transformers in batches as given by `batch`, see `_Batch`, and the
+    outputs are done by the calling thread. Everything is still done in
+    the order of `items` and the first failure stops all stages and its
+    exit code is returned.
+
+    The entries in the queues are (ret, datasets, done) where `done` is
+    the (input, path, pos) of an input which datasets has all been
+    queued, to be recorded in the `--state` once they have been outputted.
+    A None entry ends the stage."""
+    import queue
+    import threading
+
+    stop = threading.Event()
+    loaded = queue.Queue(queue_size)
+    transformed = queue.Queue(queue_size)
+
+    def put(q, entry):
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=1)
+            except queue.Empty:
+                pass
+        return None
+
+    def load():
+        try:
+            for item in items:
+                for ret, datasets in _load(item):
+                    if not put(loaded, (ret, datasets, None)) or ret > 0:
+                        return
+                if not put(loaded, (0, None, item[:3])):
+                    return
+        except Exception as e:
+            logging.critical('Input stage failed: %s' % e)
+            put(loaded, (1, None, None))
+            return
+        put(loaded, None)
+
+    class Done(object):
+        """Passes the position of inputs on to the output stage once their
+        datasets has been transformed, see `_Batch.done()`."""
+        def update(self, input, path, pos):
+            put(transformed, (0, None, (input, path, pos)))
+
+    def output(datasets):
+        ret = _transform(datasets, [], trans)
+        if ret == 0 and not put(transformed, (0, datasets, None)):
+            ret = 1
+        return ret
+
+    def transform():
+        try:
+            # generators are run for each input, see main()
+            b = _Batch(output, Done() if state else None, *batch)
+            while True:
+                entry = get(loaded)
+                if entry is None:
+                    if stop.is_set():
+                        return
+                    ret = b.flush()
+                    put(transformed, (ret, None, None) if ret > 0 else None)
+                    return
+                ret, datasets, done = entry
+                if done:
+                    b.done(*done)
+                    continue
+                if ret == 0:
+                    ret = _generate(datasets, gens)
+                if ret == 0:
+                    ret = b.add(datasets)
+                if ret > 0:
+                    put(transformed, (ret, None, None))
+                    return
+        except Exception as e:
+            logging.critical('Transformer stage failed: %s' % e)
+            put(transformed, (1, None, None))
+
+    threads = [
+        threading.Thread(target=load, name='load', daemon=True),
+        threading.Thread(target=transform, name='transform', daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            entry = get(transformed)
+            if entry is None:
+                return 0
+            ret, datasets, done = entry
+            if ret > 0:
+                return ret
+            if done:
+                state.update(*done)
+                continue
+            ret = _output(datasets, out)
+            if ret > 0:
+                return ret
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+class _Batch(object):
+    """Gathers the `Dataset`'s of several inputs for `--batch-size` and
+    gives them to `func` once there are `size` inputs, or `size` datasets
+    if `by` is "dataset". The position of an input is recorded in the
+    `--state` once all of its datasets have been given to `func`.
+    """
+    func = None
+    state = None
+    size = None
+    by = None
+    datasets = None
+    inputs = 0
+    done_inputs = None
+
+
+    def __init__(self, func, state, size, by):
+        self.func = func
+        self.state = state
+        self.size = size
+        self.by = by
+        self.datasets = []
+        self.done_inputs = []
+
+
+    def add(self, datasets):
+        self.datasets += datasets
+        self.inputs += 1
+        if self.by == 'dataset':
+            if len(self.datasets) >= self.size:
+                return self.flush()
+        elif self.inputs >= self.size:
+            return self.flush()
+        return 0
+
+
+    def done(self, input, path, pos):
+        """Called when all datasets of an input has been added."""
+        if not self.state:
+            return
+        if self.datasets:
+            self.done_inputs.append((input, path, pos))
+        else:
+            self.state.update(input, path, pos)
+
+
+    def flush(self):
+        if self.datasets:
+            ret = self.func(self.datasets)
+            if ret > 0:
+                return ret
+            self.datasets = []
+        self.inputs = 0
+
+        for input, path, pos in self.done_inputs:
+            self.state.update(input, path, pos)
+        self.done_inputs = []
+        return 0
+
+
+class _Aggregate(object):
+    """Merges the `Dataset`'s of all nodes per dataset name and start time
+    for `--aggregate-node`.
+
+    A merged `Dataset` is given back once every node has either added to
+    it or given a dataset with a later start time, since the input of each
+    node is processed in time order a node that has moved past it will not
+    add to it. With `wait` it is also given back once a dataset starting
+    `wait` seconds later has been seen from any node, so a node that is
+    down does not hold it back. Any left when the run ends are given back
+    by `flush()`.
+    """
+    node = None
+    nodes = None
+    wait = None
+    pending = None
+    latest = None
+
+
+    def __init__(self, node, nodes, wait=None):
+        self.node = node
+        self.nodes = set(nodes)
+        self.wait = wait
+        self.pending = {}
+        self.latest = {}
+
+
+    def process(self, datasets):
+        done = []
+        moved = False
+        for dataset in datasets:
+            node = node_of(dataset)
+            if dataset.start_time > self.latest.get(node, dataset.start_time - 1):
+                self.latest[node] = dataset.start_time
+                moved = True
+
+            key = (dataset.name, dataset.start_time)
+            merged, nodes = self.pending.get(key, (None, None))
+            if merged is None:
+                merged = Dataset()
+                merged.name = dataset.name
+                merged.start_time = dataset.start_time
+                merged.stop_time = dataset.stop_time
+                merged.node = self.node
+                nodes = set()
+                self.pending[key] = (merged, nodes)
+
+            merged.merge(dataset)
+            nodes.add(node)
+            if nodes >= self.nodes:
+                del self.pending[key]
+                done.append(merged)
+
+        if moved and self.pending:
+            done += self._completed()
+        return done
+
+
+    def _completed(self):
+        latest = self.latest
+        if self.wait is not None:
+            waited = max(latest.values()) - self.wait
+        done = []
+        for key, (merged, nodes) in list(self.pending.items()):
+            start_time = key[1]
+            behind = any(latest.get(node, start_time) <= start_time for node in self.nodes - nodes)
+            if behind and (self.wait is None or start_time > waited):
+                continue
+            del self.pending[key]
+            done.append(merged)
+        return done
+
+
+    def flush(self):
+        done = [ merged for merged, nodes in self.pending.values() ]
+        self.pending = {}
+        return done
+
+
+class _Counter(object):
+    """Wraps the file object of an output to count the lines and
+    characters written to it for `--stats`."""
+    fh = None
+    lines = 0
+    chars = 0
+
+
+    def __init__(self, fh):
+        self.fh = fh
+
+
+    def write(self, s):
+        self.lines += s.count('\n')
+        self.chars += len(s)
+        return self.fh.write(s)
+
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+
+class _Stats(object):
+    """Collects the statistics of `--stats` for each input file and each
+    generator, transformer and output: the number of calls, the wall and
+    CPU time spent in them, the datasets, dimensions and points (values)
+    they gave back, for outputs the lines and characters written and, if
+    memory allocations are traced with `tracemalloc` and `memory` is True,
+    the peak traced memory above what was traced when the call started.
+
+    The CPU time is of the calling thread if the platform supports it.
+    The peak is of the whole process, so `memory` must be False if calls
+    are done in more than one thread at a time.
+    """
+    file = None
+    format = None
+    names = None
+    entries = None
+    counters = None
+    started = None
+    lock = None
+    tracemalloc = None
+
+
+    def __init__(self, file, format, memory=True):
+        import threading
+        import tracemalloc
+
+        self.file = file
+        self.format = format
+        self.names = {}
+        self.entries = {}
+        self.counters = {}
+        self.started = (time.perf_counter(), time.process_time())
+        self.lock = threading.Lock()
+        if memory and tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+            self.tracemalloc = tracemalloc
+
+
+    def register(self, kind, plugin, name):
+        """Name a plugin instance, outputs writing to a file object will
+        have it wrapped to count what is written."""
+        self.names[id(plugin)] = (kind, name)
+        if kind == 'output' and getattr(plugin, 'fh', None):
+            plugin.fh = _Counter(plugin.fh)
+            self.counters[id(plugin)] = plugin.fh
+
+
+    def start(self):
+        memory = None
+        if self.tracemalloc:
+            self.tracemalloc.reset_peak()
+            memory = self.tracemalloc.get_traced_memory()[0]
+        return (time.perf_counter(), _cpu_time(), memory)
+
+
+    def add(self, plugin, started, datasets, path=None):
+        wall = time.perf_counter() - started[0]
+        cpu = _cpu_time() - started[1]
+        if path is None:
+            key = id(plugin)
+            kind, name = self.names.get(key, ('', type(plugin).__name__))
+        else:
+            key = (type(plugin).__name__, path)
+            kind, name = 'input', '%s %s' % key
+        dimensions, points = _count(datasets)
+
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                entry = self.entries[key] = {
+                    'kind': kind, 'name': name, 'calls': 0, 'wall': 0.0, 'cpu': 0.0,
+                    'datasets': 0, 'dimensions': 0, 'points': 0,
+                }
+            entry['calls'] += 1
+            entry['wall'] += wall
+            entry['cpu'] += cpu
+            entry['datasets'] += len(datasets)
+            entry['dimensions'] += dimensions
+            entry['points'] += points
+            if key in self.counters:
+                entry['lines'] = self.counters[key].lines
+                entry['chars'] = self.counters[key].chars
+            if started[2] is not None:
+                peak = self.tracemalloc.get_traced_memory()[1] - started[2]
+                entry['peak_memory'] = max(entry.get('peak_memory', 0), peak)
+
+
+    def save(self):
+        """Write the statistics to the file, or to standard error if it
+        is "-"."""
+        for key, counter in self.counters.items():
+            if key in self.entries:
+                self.entries[key]['lines'] = counter.lines
+                self.entries[key]['chars'] = counter.chars
+        stats = {
+            'wall': time.perf_counter() - self.started[0],
+            'cpu': time.process_time() - self.started[1],
+            'entries': list(self.entries.values()),
+        }
+
+        if self.file == '-':
+            _write_stats(stats, self.format, sys.stderr)
+            return
+        with open(self.file, 'w', encoding=encoding) as f:
+            _write_stats(stats, self.format, f)
+
+
+def _cpu_time():
+    if hasattr(time, 'thread_time'):
+        return time.thread_time()
+    return time.process_time()
+
+
+def _count(datasets):
+    """Returns the number of dimensions and points in the datasets."""
+    dimensions = 0
+    points = 0
+    stack = [ d for dataset in datasets for d in dataset.dimensions ]
+    while stack:
+        dimension = stack.pop()
+        dimensions += 1
+        if dimension._values:
+            points += len(dimension._values)
+        if dimension._dimensions:
+            stack += dimension._dimensions
+    return dimensions, points
+
+
+def _write_stats(stats, format, fh):
+    if format == 'json':
+        import json
+
+        json.dump(stats, fh, indent=1)
+        fh.write('\n')
+        return
+
+    tracing = any('peak_memory' in entry for entry in stats['entries'])
+    fh.write('%-11s %-40s %7s %10s %10s %9s %10s %10s %9s %11s%s\n' % ('kind', 'name', 'calls', 'wall', 'cpu',
+        'datasets', 'dimensions', 'points', 'lines', 'chars', tracing and ' %11s' % 'peak KiB' or ''))
+    for entry in stats['entries']:
+        fh.write('%-11s %-40s %7d %10.3f %10.3f %9d %10d %10d %9s %11s%s\n' % (entry['kind'], entry['name'],
+            entry['calls'], entry['wall'], entry['cpu'], entry['datasets'], entry['dimensions'], entry['points'],
+            entry.get('lines', '-'), entry.get('chars', '-'),
+            tracing and ' %11.1f' % (entry.get('peak_memory', 0) / 1024) or ''))
+    fh.write('%-11s %-40s %7s %10.3f %10.3f\n' % ('total', '', '', stats['wall'], stats['cpu']))
+
+
+class _State(object):
+    """The state of processed input for `--state`
+
+    Keeps the stat (size, mtime and inode) of processed XML files and the
+    inode, byte offset of how far each DAT file has been read and the size
+    it had at the time, indexed by the absolute path of the file.
+    For compressed DAT files the offset is in the decompressed data.
+    """
+    file = None
+    xml = None
+    dat = None
+
+
+    def __init__(self, file):
+        self.file = file
+        self.xml = {}
+        self.dat = {}
+        if file is None:
+            return
+        import json
+
+        try:
+            with open(file, 'r', encoding=encoding) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        self.xml = state.get('xml', {})
+        self.dat = state.get('dat', {})
+        self.prune()
+
+
+    def xml_pos(self, file):
+        """Returns the stat of the XML file to record after processing it or
+        None if it has already been processed."""
+        st = os.stat(file)
+        pos = [ st.st_size, st.st_mtime_ns, st.st_ino ]
+        if self.xml.get(os.path.abspath(file), None) == pos:
+            return None
+        return pos
+
+
+    def dat_pos(self, dir):
+        """Returns the offsets of the DAT files in the directory."""
+        prefix = os.path.join(os.path.abspath(dir), '')
+        return { k: v for k, v in self.dat.items() if k.startswith(prefix) }
+
+
+    def dat_grown(self, files):
+        """Returns True if any of the DAT files has been replaced or has
+        grown since it was last read."""
+        for file in files:
+            try:
+                st = os.stat(file)
+            except FileNotFoundError:
+                continue
+            pos = self.dat.get(os.path.abspath(file), None)
+            if not pos or pos[0] != st.st_ino or pos[2] != st.st_size:
+                return True
+        return False
+
+
+    def update(self, input, path, pos):
+        if input == 'XML':
+            self.xml[os.path.abspath(path)] = pos
+        else:
+            self.dat.update(pos)
+
+
+    def prune(self):
+        """Remove the entries for files that no longer exists, this is done
+        when loaded and when `--watch` stops rather than on every save."""
+        self.xml = { k: v for k, v in self.xml.items() if os.path.exists(k) }
+        self.dat = { k: v for k, v in self.dat.items() if os.path.exists(k) }
+
+
+    def save(self):
+        """Atomically replace the state file."""
+        if self.file is None:
+            return
+        import json
+        import tempfile
+
+        fd, tmp = tempfile.mkstemp(prefix='.%s.' % os.path.basename(self.file), dir=os.path.dirname(os.path.abspath(self.file)))
+        try:
+            with os.fdopen(fd, 'w', encoding=encoding) as f:
+                json.dump({ 'xml': self.xml, 'dat': self.dat }, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.file)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+
+def _strip_compression(file):
+    ext = os.path.splitext(file)[1].lower()
+    if ext in _compression:
+        return file[:-len(ext)]
+    return file
+
+
+_xml_timestamp = re.compile(r'^(\d+)\.')
+
+
+def _parse_time(value):
+    """Parse the time given to `--start` and `--stop`, either as seconds
+    since epoch or as a date and time in UTC."""
+    import calendar
+
+    if re.match(r'^\d+$', value):
+        return int(value)
+    if value.endswith('Z'):
+        value = value[:-1]
+    for format in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(value, format))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError('invalid time %r' % value)
+
+
+def _xml_in_time_range(file):
+    """Returns False if the name of the XML file tells that its datasets are
+    outside of the time range. DSC names the files after the stop time of
+    the datasets in them, files without a timestamp in the name are always
+    processed."""
+    if not time_range:
+        return True
+    m = _xml_timestamp.match(os.path.basename(file))
+    if not m:
+        return True
+    stop_time = int(m.group(1))
+    if 'start' in time_range and stop_time <= time_range['start']:
+        return False
+    if 'stop' in time_range and stop_time > time_range['stop']:
+        return False
+    return True
+
+
+def _xml_files(xml):
+    """Returns the XML files, and the node they are from, to process for the
+    given `--xml` and `--node-xml` entries as a list of `(path, node)`.
+    Directories are scanned for files ending with .xml, optionally followed
+    by a compression extension, and tar archives. Files that are outside of
+    the time range, going by their names, are left out."""
+    files = []
+    for entry, node in xml:
+        if not os.path.isdir(entry):
+            files.append((entry, node))
+            continue
+        with os.scandir(entry) as dir:
+            for file in dir:
+                if file.name.startswith('.') or not file.is_file():
+                    continue
+                if _strip_compression(file.name.lower()).endswith('.xml') or _is_tar(file.name):
+                    files.append((file.path, node))
+
+    if not time_range:
+        return files
+    selected = []
+    for file, node in files:
+        if _is_tar(file) or _xml_in_time_range(file):
+            selected.append((file, node))
+        else:
+            logging.debug('Skipping XML file %s outside of the time range' % file)
+    return selected
+
+
+def _xml_time(file):
+    """Returns the timestamp in the name of the XML file, or 0."""
+    m = _xml_timestamp.match(os.path.basename(file[0]))
+    if not m:
+        return 0
+    return int(m.group(1))
+
+
+def _items(files, dat, state):
+    """Returns the items to give to `_load()` for the XML files and DAT
+    directories, anything that has already been processed according to
+    the state is left out."""
+    items = []
+    for file, node in files:
+        pos = None
+        if state:
+            pos = state.xml_pos(file)
+            if pos is None:
+                logging.debug('Skipping already processed XML file %s' % file)
+                continue
+        items.append(('XML', file, pos, node))
+    for dir, node in dat:
+        pos = None
+        if state:
+            pos = state.dat_pos(dir)
+        items.append(('DAT', dir, pos, node))
+    return items
+
+
+def _flush(outputs):
+    """Make sure everything the outputs have written so far is flushed,
+    returns 2 if an output failed to do so."""
+    sys.stdout.flush()
+    for output in outputs:
+        if getattr(output, 'fh', None):
+            try:
+                output.fh.flush()
+            except Exception as e:
+                logging.warning('Output %s failed: %s' % (output, e))
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                for tb in traceback.format_tb(exc_traceback):
+                    logging.warning(str(tb))
+                return 2
+    return 0
+
+
+def _watch(xml, dat, gens, trans, out, state, interval, queue_size):
+    """Poll the XML files and directories and the DAT directories for new
+    or grown files and process them as they show up, until SIGTERM or
+    SIGINT is received.
+
+    The polling is done in a separate thread which queues the items,
+    at most `queue_size` items are kept in the queue.
+
+    The `--state` is saved after each item, unless datasets can be held
+    back, then it is only saved once they have been outputted when
+    exiting."""
+    import queue
+    import signal
+    import threading
+
+    holding = _holding(trans)
+    stop = threading.Event()
+    lock = threading.Lock()
+    items = queue.Queue(queue_size)
+    queued = set()
+
+    def poll():
+        while not stop.is_set():
+            try:
+                with lock:
+                    files = _xml_files(xml)
+                    if _holding(trans):
+                        files.sort(key=_xml_time)
+                    new = [ item for item in _items(files, dat, state)
+                        if not item[:2] in queued and (item[0] != 'DAT' or state.dat_grown(_plugin('input', 'DAT')().files(item[1]))) ]
+                    queued.update(item[:2] for item in new)
+                for item in new:
+                    while not stop.is_set():
+                        try:
+                            items.put(item, timeout=1)
+                            break
+                        except queue.Full:
+                            pass
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                logging.error('Unable to poll for new input: %s' % e)
+            stop.wait(interval)
+
+    def terminate(signum, frame):
+        logging.info('Received signal %d, shutting down' % signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+
+    poller = threading.Thread(target=poll, name='poll', daemon=True)
+    poller.start()
+
+    try:
+        while not stop.is_set():
+            try:
+                item = items.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            pos = item[2]
+            for ret, datasets in _load(item):
+                if ret > 0:
+                    # don't try a broken XML file again but DAT files are
+                    # retried from where they where
+                    if item[0] == 'DAT':
+                        pos = {}
+                    break
+                ret = _process(datasets, gens, trans, out)
+                if ret > 0:
+                    return ret
+
+            ret = _flush(out)
+            if ret > 0:
+                return ret
+            with lock:
+                state.update(item[0], item[1], pos)
+                queued.discard(item[:2])
+                if not holding:
+                    state.save()
+    finally:
+        stop.set()
+        poller.join()
+
+    return 0
+
+
+def main():
+    """Called when running `dsc-datatool`."""
     def split_arg(arg, num=1):
         sep = arg[0]
         p = arg.split(sep)
@@ -261,56 +1614,7 @@ def main():
         return ret
 
 
-    def _process(datasets, generators, transformers, outputs):
-        gen_datasets = []
-        for generator in generators:
-            try:
-                gen_datasets += generator.process(datasets)
-            except Exception as e:
-                logging.warning('Generator %s failed: %s' % (generator, e))
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                for tb in traceback.format_tb(exc_traceback):
-                    logging.warning(str(tb))
-                return 2
-
-        datasets += gen_datasets
-
-        if '*' in transformers:
-            for transformer in transformers['*']:
-                try:
-                    transformer.process(datasets)
-                except Exception as e:
-                    logging.warning('Transformer %s failed: %s' % (transformer, e))
-                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                    for tb in traceback.format_tb(exc_traceback):
-                        logging.warning(str(tb))
-                    return 2
-        for dataset in datasets:
-            if dataset.name in transformers:
-                for transformer in transformers[dataset.name]:
-                    try:
-                        transformer.process([dataset])
-                    except Exception as e:
-                        logging.warning('Transformer %s failed: %s' % (transformer, e))
-                        exc_type, exc_value, exc_traceback = sys.exc_info()
-                        for tb in traceback.format_tb(exc_traceback):
-                            logging.warning(str(tb))
-                        return 2
-
-        for output in outputs:
-            try:
-                output.process(datasets)
-            except Exception as e:
-                logging.warning('Output %s failed: %s' % (output, e))
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                for tb in traceback.format_tb(exc_traceback):
-                    logging.warning(str(tb))
-                return 2
-
-        return 0
-
-
-    global args, inputs, outputs, generators, transformers, process_dataset
+    global args, inputs, outputs, generators, transformers, process_dataset, time_range, _aggregate, _stats
 
     parser = argparse.ArgumentParser(prog='dsc-datatool',
         description='Export DSC data into various formats and databases.',
@@ -323,17 +1627,49 @@ def main():
     parser.add_argument('-n', '--node', nargs=1,
         help='Specify the node for where the data comes from. (required)')
     parser.add_argument('-x', '--xml', action='append',
-        help='Read DSC data from the given file or directory, can be specified multiple times. If a directory is given then all files ending with .xml will be read.')
+        help='Read DSC data from the given file or directory, can be specified multiple times. If a directory is given then all files ending with .xml will be read. Files compressed with gzip, bzip2 or xz (.gz, .bz2, .xz) and XML files in tar archives are also read.')
     parser.add_argument('-d', '--dat', action='append',
-        help='Read DSC data from the given directory, can be specified multiple times. Note that the DAT format is depended on the filename to know what type of data it is.')
+        help='Read DSC data from the given directory, can be specified multiple times. Note that the DAT format is depended on the filename to know what type of data it is. The files may be compressed with gzip, bzip2 or xz (.gz, .bz2, .xz).')
+    parser.add_argument('--node-xml', nargs=2, action='append', metavar=('NODE', 'XML'),
+        help='Read DSC data from the given file or directory, in the same way as --xml, but it is from the given node instead of --node. Can be specified multiple times.')
+    parser.add_argument('--node-dat', nargs=2, action='append', metavar=('NODE', 'DAT'),
+        help='Read DSC data from the given directory, in the same way as --dat, but it is from the given node instead of --node. Can be specified multiple times.')
+    parser.add_argument('--aggregate-node',
+        help='Also output the datasets of all nodes merged, by dataset name and start time, as from the given node.')
+    parser.add_argument('--aggregate-wait', type=int,
+        help='With --aggregate-node, output a merged dataset that is still missing data from some node once a dataset starting the given number of seconds later has been seen.')
     parser.add_argument('--dataset', action='append',
         help='Specify that only the list of datasets will be processed, the list is comma separated and the option can be given multiple times.')
+    parser.add_argument('--start', type=_parse_time,
+        help='Only process datasets starting at or after the given time, either seconds since epoch or YYYY-MM-DD[THH:MM[:SS]] in UTC.')
+    parser.add_argument('--stop', type=_parse_time,
+        help='Only process datasets ending at or before the given time, either seconds since epoch or YYYY-MM-DD[THH:MM[:SS]] in UTC.')
     parser.add_argument('-o', '--output', action='append',
         help='"<sep><output>[<sep>option=value...]>" Output data to <output> and use <separator> as an options separator.')
     parser.add_argument('-t', '--transform', action='append',
         help='"<sep><name><sep><datasets>[<sep>option=value...]>" Use the transformer <name> to change the list of datasets in <datasets>.')
     parser.add_argument('-g', '--generator', action='append',
         help='"<name>[,<name>,...]" or "<sep><name>[<sep>option=value...]>" Use the specified generators to generate additional datasets.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='Parse the XML files and DAT directories and run generators and transformers in the given number of worker processes, output is still done in the order of the input. (default to 1)')
+    parser.add_argument('--batch-size', type=int, default=1,
+        help='Gather the datasets of the given number of input files, or DAT intervals, and run the generators, transformers and outputs once for all of them. (default to 1)')
+    parser.add_argument('--batch-by', choices=[ 'input', 'dataset' ], default='input',
+        help='Make --batch-size count datasets instead of input. (default to input)')
+    parser.add_argument('--pipeline', action='store_true',
+        help='Read the input, run the generators and transformers and do the outputs in separate threads so reading the next input overlaps with the processing of the current one, output is still done in the order of the input.')
+    parser.add_argument('--stats',
+        help='Write statistics of the time spent and the datasets processed for each input file, generator, transformer and output to the given file, or standard error if "-", when exiting.')
+    parser.add_argument('--stats-format', choices=[ 'text', 'json' ], default='text',
+        help='The format of --stats. (default to text)')
+    parser.add_argument('--state',
+        help='Keep track of processed input in the given file, XML files already processed will be skipped and DAT files will only be read from where the last run ended.')
+    parser.add_argument('-w', '--watch', action='store_true',
+        help='Keep running and poll the --xml and --dat paths for new or grown files, process them as they show up. Stops on SIGTERM or SIGINT.')
+    parser.add_argument('--interval', type=float, default=10,
+        help='Seconds between polling for new input in --watch mode. (default to 10)')
+    parser.add_argument('--queue-size', type=int, default=16,
+        help='Maximum number of files and directories waiting to be processed in --watch mode, or sets of datasets waiting between the stages of --pipeline. (default to 16)')
     parser.add_argument('--list', action='store_true',
         help='List the available generators, transformers and outputs then exit.')
     parser.add_argument('--skipped-key', nargs=1, default='-:SKIPPED:-',
@@ -354,33 +1690,19 @@ def main():
         log_level = 0
     logging.basicConfig(format='%(asctime)s %(levelname)s %(module)s: %(message)s', level=log_level, stream=sys.stderr)
 
-    import dsc_datatool.input
-    import dsc_datatool.output
-    import dsc_datatool.generator
-    import dsc_datatool.transformer
-
-    for finder, name, ispkg in iter_namespace(dsc_datatool.input):
-        importlib.import_module(name)
-    for finder, name, ispkg in iter_namespace(dsc_datatool.output):
-        importlib.import_module(name)
-    for finder, name, ispkg in iter_namespace(dsc_datatool.generator):
-        importlib.import_module(name)
-    for finder, name, ispkg in iter_namespace(dsc_datatool.transformer):
-        importlib.import_module(name)
-
     if args.list:
         print('Generators:')
-        for name in generators:
+        for name in _plugin_names('generator'):
             print('',name)
         print('Transformers:')
-        for name in transformers:
+        for name in _plugin_names('transformer'):
             print('',name)
         print('Outputs:')
-        for name in outputs:
+        for name in _plugin_names('output'):
             print('',name)
         return 0
 
-    if not args.server or not args.node:
+    if not args.server or (not args.node and (args.xml or args.dat or not (args.node_xml or args.node_dat))):
         raise Exception('--server and --node must be given')
 
     if isinstance(args.server, list):
@@ -389,7 +1711,7 @@ def main():
         raise Exception('Invalid argument for --server: %r' % args.server)
     if isinstance(args.node, list):
         args.node = ' '.join(args.node)
-    elif not isinstance(args.node, str):
+    elif args.node is not None and not isinstance(args.node, str):
         raise Exception('Invalid argument for --node: %r' % args.node)
 
     gens = []
@@ -397,88 +1719,169 @@ def main():
         for arg in args.generator:
             if not re.match(r'^\w', arg):
                 name, opts = split_arg(arg)
-                if not name in generators:
+                generator = _plugin('generator', name)
+                if generator is None:
                     logging.critical('Generator %s does not exist' % name)
                     return 1
-                gens.append(generators[name](parse_opts(opts)))
+                gens.append(generator(parse_opts(opts)))
                 continue
             for name in arg.split(','):
-                if not name in generators:
+                generator = _plugin('generator', name)
+                if generator is None:
                     logging.critical('Generator %s does not exist' % name)
                     return 1
-                gens.append(generators[name]({}))
+                gens.append(generator({}))
 
     trans = {}
     if args.transform:
         for arg in args.transform:
             name, datasets, opts = split_arg(arg, num=2)
-            if not name in transformers:
+            transformer = _plugin('transformer', name)
+            if transformer is None:
                 logging.critical('Transformer %s does not exist' % name)
                 return 1
             for dataset in datasets.split(','):
                 if not dataset in trans:
                     trans[dataset] = []
-                trans[dataset].append(transformers[name](parse_opts(opts)))
+                trans[dataset].append(transformer(parse_opts(opts)))
+
+    if args.batch_size < 1:
+        logging.critical('--batch-size must be at least 1')
+        return 1
+
+    if args.jobs > 1 and args.pipeline:
+        logging.critical('--pipeline can not be used with --jobs')
+        return 1
+
+    if args.watch and (args.jobs > 1 or args.pipeline or args.batch_size > 1):
+        logging.critical('--watch can not be used with --jobs, --pipeline or --batch-size')
+        return 1
+
+    if args.jobs > 1 and args.stats:
+        logging.critical('--stats can not be used with --jobs')
+        return 1
+
+    if args.jobs > 1 and _holds_back(trans):
+        logging.critical('Transformer %s can not be used with --jobs' % type(_holds_back(trans)[0]).__name__)
+        return 1
 
     out = []
     if args.output:
         for arg in args.output:
             name, opts = split_arg(arg)
-            if not name in outputs:
+            output = _plugin('output', name)
+            if output is None:
                 logging.critical('Output %s does not exist' % name)
                 return 1
-            out.append(outputs[name](parse_opts(opts)))
+            out.append(output(parse_opts(opts)))
+
+    if args.stats:
+        import atexit
+
+        # the traced memory is of the process, the stages of --pipeline
+        # would be measuring each other
+        _stats = _Stats(args.stats, args.stats_format, not args.pipeline)
+        count = {}
+        def numbered(plugin):
+            name = type(plugin).__name__
+            count[name] = count.get(name, 0) + 1
+            if count[name] > 1:
+                return '%s#%d' % (name, count[name])
+            return name
+        for generator in gens:
+            _stats.register('generator', generator, numbered(generator))
+        for dataset, chain in trans.items():
+            for transformer in chain:
+                _stats.register('transformer', transformer, '%s %s' % (type(transformer).__name__, dataset))
+        for output in out:
+            _stats.register('output', output, numbered(output))
+        atexit.register(_stats.save)
 
     if args.dataset:
         for dataset in args.dataset:
             for p in dataset.split(','):
                 process_dataset[p] = True
 
+    if args.start is not None:
+        time_range['start'] = args.start
+    if args.stop is not None:
+        time_range['stop'] = args.stop
+    if args.start is not None and args.stop is not None and args.start >= args.stop:
+        logging.critical('--start must be before --stop')
+        return 1
+
     xml = []
-    if args.xml:
-        for entry in args.xml:
-            if os.path.isfile(entry):
-                xml.append(entry)
-            elif os.path.isdir(entry):
-                with os.scandir(entry) as dir:
-                    for file in dir:
-                        if not file.name.startswith('.') and file.is_file() and file.name.lower().endswith('.xml'):
-                            xml.append(file.path)
-            else:
-                logging.error('--xml %r is not a file or directory' % entry)
+    for node, entry in [ (None, entry) for entry in args.xml or [] ] + (args.node_xml or []):
+        if os.path.isfile(entry) or os.path.isdir(entry):
+            xml.append((entry, node))
+        else:
+            logging.error('--%sxml %r is not a file or directory' % (node and 'node-' or '', entry))
 
     dat = []
-    if args.dat:
-        for entry in args.dat:
-            if os.path.isdir(entry):
-                dat.append(entry)
-            else:
-                logging.error('--dat %r is not a directory' % entry)
-
-    if not xml and not dat:
-        logging.error('No valid --xml or --dat given')
+    for node, entry in [ (None, entry) for entry in args.dat or [] ] + (args.node_dat or []):
+        if os.path.isdir(entry):
+            dat.append((entry, node))
+        else:
+            logging.error('--%sdat %r is not a directory' % (node and 'node-' or '', entry))
+
+    if args.aggregate_wait is not None and (not args.aggregate_node or args.aggregate_wait < 0):
+        logging.critical('--aggregate-wait must be at least 0 and used with --aggregate-node')
         return 1
 
-    xml_input = inputs['XML']()
-    for file in xml:
-        try:
-            datasets = xml_input.process(file)
-        except Exception as e:
-            logging.critical('Unable to process XML file %s: %s' % (file, e))
+    if args.aggregate_node:
+        nodes = set(node or args.node for entry, node in xml + dat)
+        if args.aggregate_node in nodes:
+            logging.critical('--aggregate-node %r is also the node of an input' % args.aggregate_node)
             return 1
+        _aggregate = _Aggregate(args.aggregate_node, nodes, args.aggregate_wait)
 
-        ret = _process(datasets, gens, trans, out)
-        if ret > 0:
-            return ret
-
-    dat_input = inputs['DAT']()
-    for dir in dat:
-        try:
-            datasets = dat_input.process(dir)
-        except Exception as e:
-            logging.critical('Unable to process DAT files in %s: %s' % (dir, e))
+    if args.watch:
+        if not xml and not dat:
+            logging.error('No valid --xml or --dat given')
             return 1
 
-        ret = _process(datasets, gens, trans, out)
-        if ret > 0:
+        state = _State(args.state)
+        ret = 1
+        try:
+            ret = _watch(xml, dat, gens, trans, out, state, args.interval, args.queue_size)
+            if ret == 0:
+                ret = _finish(trans, out)
             return ret
+        finally:
+            if _flush(out) == 0 and (ret == 0 or not _holding(trans)):
+                state.prune()
+                state.save()
+
+    files = _xml_files(xml)
+    if not files and not dat:
+        logging.error('No valid --xml or --dat given')
+        return 1
+
+    state = None
+    if args.state:
+        state = _State(args.state)
+
+    if _holding(trans):
+        # process the XML files of all nodes in time order so merged and
+        # held back datasets are completed as soon as possible, and once
+        files.sort(key=_xml_time)
+
+    items = _items(files, dat, state)
+
+    ret = 1
+    try:
+        if args.jobs > 1:
+            ret = _run_jobs(items, gens, trans, out, args.jobs, state, (args.batch_size, args.batch_by))
+        elif args.pipeline:
+            ret = _pipeline(items, gens, trans, out, state, (args.batch_size, args.batch_by), args.queue_size)
+        else:
+            ret = _run(items, gens, trans, out, state, (args.batch_size, args.batch_by))
+        if ret == 0:
+            ret = _finish(trans, out)
+        return ret
+    finally:
+        if state:
+            # make sure everything recorded in the state has been written,
+            # and that nothing held back from it is lost
+            if _flush(out) == 0 and (ret == 0 or not _holding(trans)):
+                state.save()
@@ -2,14 +2,23 @@
 
 Input plugin to generate `Dataset`'s from DSC DAT files.
 
+The DAT files in a directory are read in parallel and merged on the
+timestamp of the lines by `DAT.stream()` so that the `Dataset`'s can be
+processed one interval at a time.
+
 Part of dsc_datatool.
 
 :copyright: 2024 OARC, Inc.
 """
 
-import re
+import os
+import heapq
+
+from dsc_datatool import Input, Dataset, Dimension, process_dataset, time_range, in_time_range, encoding, open_file, intern
+
 
-from dsc_datatool import Input, Dataset, Dimension, process_dataset, encoding
+_compressed = [ '.gz', '.bz2', '.xz' ]
+_bisect_size = 65536
 
 
 _dataset1d = [
@@ -45,131 +54,258 @@ _dataset3d = {
 }
 
 
+def _split(l):
+    """Split the line on runs of whitespace, leading and trailing whitespace
+    gives empty elements in the same way as a regular expression split."""
+    dat = l.split()
+    if not dat:
+        if l:
+            return [ '', '' ]
+        return [ '' ]
+    if l[0].isspace():
+        dat.insert(0, '')
+    if l[-1].isspace():
+        dat.append('')
+    return dat
+
+
+def _timestamp(l):
+    """Returns the timestamp of the DAT line or None if it does not start
+    with one."""
+    if l[:1].isspace():
+        return None
+    try:
+        return int(l.split(None, 1)[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def _bisect(f, lo, hi, start):
+    """Returns the offset of a line at or before the first line with a
+    timestamp at or after `start` by doing a binary search on the byte
+    offset in the file between `lo`, which must be the start of a line,
+    and `hi`. The lines of a DAT file are sorted by time since DSC appends
+    a line every minute."""
+    while hi - lo > _bisect_size:
+        mid = (lo + hi) // 2
+        f.seek(mid - 1)
+        f.readline()
+        pos = f.tell()
+        l = f.readline()
+        while l.startswith(b'#'):
+            pos += len(l)
+            l = f.readline()
+        ts = _timestamp(l)
+        if pos < hi and ts is not None and ts < start and l.endswith(b'\n'):
+            lo = pos + len(l)
+        else:
+            hi = mid
+    return lo
+
+
 class DAT(Input):
-    def process(self, dir):
+    offsets = None
+
+
+    def _lines(self, file):
+        """Yields the lines of the DAT file.
+
+        If `offsets` is set then it's used as a dict with the inode, offset
+        and size of each file, indexed by absolute path, to continue reading
+        from and it will be updated once the file has been read. In that
+        case an incomplete last line is left to be read by a later run.
+
+        Lines outside of the time range are skipped, with `--start` the
+        first line to read is found by a binary search in uncompressed
+        files and reading ends at the first line after `--stop`."""
+        with open_file(file) as f:
+            offset = 0
+            if self.offsets is not None:
+                key = os.path.abspath(file)
+                st = os.fstat(f.fileno())
+                pos = self.offsets.get(key, None)
+                if pos and pos[0] == st.st_ino and pos[2] <= st.st_size:
+                    offset = pos[1]
+                    f.seek(offset)
+
+            if 'start' in time_range and not os.path.splitext(file)[1].lower() in _compressed:
+                offset = _bisect(f, offset, os.fstat(f.fileno()).st_size, time_range['start'])
+                f.seek(offset)
+
+            for l in f:
+                if self.offsets is not None and not l.endswith(b'\n'):
+                    break
+                if time_range and not l.startswith(b'#'):
+                    ts = _timestamp(l)
+                    if ts is not None and not in_time_range(ts, ts + 60):
+                        if 'stop' in time_range and ts + 60 > time_range['stop']:
+                            break
+                        offset += len(l)
+                        continue
+                offset += len(l)
+                yield l.decode(encoding)
+
+            if self.offsets is not None:
+                self.offsets[key] = [ st.st_ino, offset, st.st_size ]
+
+
+    def _file(self, dir, name):
+        file = '%s/%s.dat' % (dir, name)
+        if not os.path.exists(file):
+            for ext in _compressed:
+                if os.path.exists(file + ext):
+                    return file + ext
+        return file
+
+
+    def _selected(self, dir):
+        """Returns `(file, read, args)` for each DAT file found in the
+        directory for the datasets being processed."""
         global _dataset1d, _dataset2d, _dataset3d
 
-        datasets = []
+        selected = []
 
         for d in _dataset1d:
             if process_dataset and not d in process_dataset:
                 continue
-            try:
-                datasets += self.process1d('%s/%s.dat' % (dir, d), d)
-            except FileNotFoundError:
-                pass
+            file = self._file(dir, d)
+            if os.path.exists(file):
+                selected.append((file, self.read1d, (d,)))
         for k, v in _dataset2d.items():
             if process_dataset and not k in process_dataset:
                 continue
-            try:
-                datasets += self.process2d('%s/%s.dat' % (dir, k), k, v)
-            except FileNotFoundError:
-                pass
+            file = self._file(dir, k)
+            if os.path.exists(file):
+                selected.append((file, self.read2d, (k, v)))
         for k, v in _dataset3d.items():
             if process_dataset and not k in process_dataset:
                 continue
-            try:
-                datasets += self.process3d('%s/%s.dat' % (dir, k), k, v[0], v[1])
-            except FileNotFoundError:
-                pass
+            file = self._file(dir, k)
+            if os.path.exists(file):
+                selected.append((file, self.read3d, (k, v[0], v[1])))
+
+        return selected
+
+
+    def files(self, dir):
+        """DAT.files(dir) -> [ file, ... ]
+
+        Returns the DAT files in the directory that would be read, other
+        files in it are not used."""
+        return [ file for file, read, args in self._selected(dir) ]
 
+
+    def _readers(self, dir):
+        """Returns a list with a generator of `Dataset`'s for each DAT file
+        found in the directory."""
+        return [ read(file, *args) for file, read, args in self._selected(dir) ]
+
+
+    def process(self, dir):
+        datasets = []
+        for reader in self._readers(dir):
+            datasets += reader
         return datasets
 
 
+    def stream(self, dir):
+        """DAT.stream(dir) -> generator of [ Dataset, ... ]
+
+        Read all DAT files in the directory at the same time and yield the
+        `Dataset`'s of one timestamp at a time, so only the datasets of one
+        interval are kept in memory."""
+        batch = []
+        for dataset in heapq.merge(*self._readers(dir), key=lambda dataset: dataset.start_time):
+            if batch and batch[0].start_time != dataset.start_time:
+                yield batch
+                batch = []
+            batch.append(dataset)
+        if batch:
+            yield batch
+
+
     def process1d(self, file, name):
-        datasets = []
-        with open(file, 'r', encoding=encoding) as f:
-            for l in f.readlines():
-                if re.match(r'^#', l):
-                    continue
-                l = re.sub(r'[\r\n]+$', '', l)
-                dat = re.split(r'\s+', l)
-                if len(dat) != 2:
-                    raise Exception('DAT %r dataset %r: invalid number of elements for a 1d dataset' % (file, name))
-
-                dataset = Dataset()
-                dataset.name = name
-                dataset.start_time = int(dat.pop(0))
-                dataset.stop_time = dataset.start_time + 60
-
-                d1 = Dimension('All')
-                d1.values = { 'ALL': int(dat[0]) }
-                dataset.dimensions.append(d1)
+        return list(self.read1d(file, name))
 
-                datasets.append(dataset)
 
-        return datasets
+    def read1d(self, file, name):
+        for l in self._lines(file):
+            if l.startswith('#'):
+                continue
+            dat = _split(l.rstrip('\r\n'))
+            if len(dat) != 2:
+                raise Exception('DAT %r dataset %r: invalid number of elements for a 1d dataset' % (file, name))
+
+            dataset = Dataset()
+            dataset.name = name
+            dataset.start_time = int(dat[0])
+            dataset.stop_time = dataset.start_time + 60
+
+            d1 = Dimension('All')
+            d1.values = { 'ALL': int(dat[1]) }
+            dataset.dimensions.append(d1)
+
+            yield dataset
 
 
     def process2d(self, file, name, field):
-        datasets = []
-        with open(file, 'r', encoding=encoding) as f:
-            for l in f.readlines():
-                if re.match(r'^#', l):
-                    continue
-                l = re.sub(r'[\r\n]+$', '', l)
-                dat = re.split(r'\s+', l)
-
-                dataset = Dataset()
-                dataset.name = name
-                dataset.start_time = int(dat.pop(0))
-                dataset.stop_time = dataset.start_time + 60
-
-                d1 = Dimension('All')
-                d1.value = 'ALL'
-                dataset.dimensions.append(d1)
+        return list(self.read2d(file, name, field))
 
-                d2 = Dimension(field)
-                while dat:
-                    if len(dat) < 2:
-                        raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
-                    k = dat.pop(0)
-                    v = dat.pop(0)
-                    d2.values[k] = int(v)
-                d1.dimensions.append(d2)
 
-                datasets.append(dataset)
+    def read2d(self, file, name, field):
+        for l in self._lines(file):
+            if l.startswith('#'):
+                continue
+            dat = _split(l.rstrip('\r\n'))
 
-        return datasets
+            dataset = Dataset()
+            dataset.name = name
+            dataset.start_time = int(dat[0])
+            dataset.stop_time = dataset.start_time + 60
+
+            d1 = Dimension('All')
+            d1.value = 'ALL'
+            dataset.dimensions.append(d1)
+
+            d2 = Dimension(field)
+            d2.values.update(zip(map(intern, dat[1::2]), map(int, dat[2::2])))
+            if not len(dat) & 1:
+                raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
+            d1.dimensions.append(d2)
+
+            yield dataset
 
 
     def process3d(self, file, name, first, second):
-        datasets = []
-        with open(file, 'r', encoding=encoding) as f:
-            for l in f.readlines():
-                if re.match(r'^#', l):
-                    continue
-                l = re.sub(r'[\r\n]+$', '', l)
-                dat = re.split(r'\s+', l)
-
-                dataset = Dataset()
-                dataset.name = name
-                dataset.start_time = int(dat.pop(0))
-                dataset.stop_time = dataset.start_time + 60
-
-                while dat:
-                    if len(dat) < 2:
-                        raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
-                    k = dat.pop(0)
-                    v = dat.pop(0)
-
-                    d1 = Dimension(first)
-                    d1.value = k
-                    dataset.dimensions.append(d1)
-
-                    d2 = Dimension(second)
-                    dat2 = v.split(':')
-                    while dat2:
-                        if len(dat2) < 2:
-                            raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
-                        k2 = dat2.pop(0)
-                        v2 = dat2.pop(0)
-                        d2.values[k2] = int(v2)
-                    d1.dimensions.append(d2)
-
-                datasets.append(dataset)
+        return list(self.read3d(file, name, first, second))
 
-        return datasets
+
+    def read3d(self, file, name, first, second):
+        for l in self._lines(file):
+            if l.startswith('#'):
+                continue
+            dat = _split(l.rstrip('\r\n'))
+
+            dataset = Dataset()
+            dataset.name = name
+            dataset.start_time = int(dat[0])
+            dataset.stop_time = dataset.start_time + 60
+
+            for k, v in zip(dat[1::2], dat[2::2]):
+                d1 = Dimension(first)
+                d1.value = intern(k)
+                dataset.dimensions.append(d1)
+
+                d2 = Dimension(second)
+                dat2 = v.split(':')
+                d2.values.update(zip(map(intern, dat2[0::2]), map(int, dat2[1::2])))
+                if len(dat2) & 1:
+                    raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
+                d1.dimensions.append(d2)
+            if not len(dat) & 1:
+                raise Exception('DAT %r dataset %r: invalid number of elements for a 2d dataset' % (file, name))
+
+            yield dataset
 
 
 import sys
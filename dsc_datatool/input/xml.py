@@ -2,68 +2,214 @@
 
 Input plugin to generate `Dataset`'s from DSC XML files.
 
+The XML is parsed as a stream using expat, `Dataset`'s and `Dimension`'s
+are built directly from the parser events so no document tree is ever
+held in memory.
+
+When only some datasets are processed (`--dataset`) the arrays that are
+not wanted are cut out of the byte stream before it reaches expat, so
+their content is never parsed. Arrays outside of the time range (`--start`
+and `--stop`) are skipped by the parser.
+
 Part of dsc_datatool.
 
 :copyright: 2024 OARC, Inc.
 """
 
 import logging
-from xml.dom import minidom
+import re
+from xml.parsers import expat
 import base64
 
-from dsc_datatool import Input, Dataset, Dimension, process_dataset
+from dsc_datatool import Input, Dataset, Dimension, process_dataset, time_range, in_time_range, open_file, intern
+
+
+_read_size = 65536
+_array_name = re.compile(rb'\sname\s*=\s*("([^"]*)"|\'([^\']*)\')')
+
+
+def _decode(attrs):
+    val = attrs.get('val', '')
+    try:
+        if attrs.get('base64', ''):
+            val = base64.b64decode(val).decode('utf-8')
+    except Exception as e:
+        pass
+    return intern(val)
+
+
+class _Parser(object):
+    """Keeps the state while expat walks through a DSC XML document."""
+    datasets = None
+    dataset = None
+    dimensions = None
+    d2 = None
+    skip = 0
+
+
+    def __init__(self):
+        self.datasets = []
+
+
+    def start(self, name, attrs):
+        if self.skip:
+            self.skip += 1
+            return
+
+        if self.dataset is None:
+            if name != 'array':
+                return
+            if process_dataset and not attrs.get('name', '') in process_dataset:
+                self.skip = 1
+                return
+
+            start_time = int(attrs.get('start_time', ''))
+            stop_time = int(attrs.get('stop_time', ''))
+            if time_range and not in_time_range(start_time, stop_time):
+                self.skip = 1
+                return
+
+            self.dataset = Dataset()
+            self.dataset.name = intern(attrs.get('name', ''))
+            self.dataset.start_time = start_time
+            self.dataset.stop_time = stop_time
+            self.dimensions = [None, None]
+            self.datasets.append(self.dataset)
+            return
+
+        if self.d2 is not None:
+            if name == self.dimensions[1]:
+                self.d2.values[_decode(attrs)] = int(attrs.get('count', ''))
+            return
+
+        if name == self.dimensions[0]:
+            d1 = Dimension(self.dimensions[0])
+            d1.value = _decode(attrs)
+            self.dataset.dimensions.append(d1)
+
+            self.d2 = Dimension(self.dimensions[1])
+            d1.dimensions.append(self.d2)
+        elif name == 'dimension':
+            number = attrs.get('number', '')
+            if number == '1':
+                if self.dimensions[0]:
+                    logging.warning('Overwriting dimension 1 for %s' % self.dataset.name)
+                self.dimensions[0] = intern(attrs.get('type', ''))
+            elif number == '2':
+                if self.dimensions[1]:
+                    logging.warning('Overwriting dimension 2 for %s' % self.dataset.name)
+                self.dimensions[1] = intern(attrs.get('type', ''))
+            else:
+                logging.warning('Invalid dimension number %r for %s' % (number, self.dataset.name))
+
+
+    def end(self, name):
+        if self.skip:
+            self.skip -= 1
+            return
+
+        if self.dataset is None:
+            return
+
+        if self.d2 is not None:
+            if name == self.dimensions[0]:
+                self.d2 = None
+        elif name == 'array':
+            self.dataset = None
+
+
+def _wanted(tag):
+    """Returns False if the array start tag is for a dataset that should not
+    be processed, anything that can not be decided here is left to the
+    parser."""
+    m = _array_name.search(tag)
+    if not m:
+        return True
+    name = m.group(2) if m.group(2) is not None else m.group(3)
+    if b'&' in name:
+        return True
+    return name.decode('utf-8', 'replace') in process_dataset
+
+
+def _filter(file):
+    """Yields the content of `file` with the arrays of unwanted datasets
+    removed."""
+    buf = b''
+    skip = False
+    eof = False
+    while not eof:
+        data = file.read(_read_size)
+        if data:
+            buf += data
+        else:
+            eof = True
+
+        while buf:
+            if skip:
+                i = buf.find(b'</array>')
+                if i < 0:
+                    buf = buf[-7:]
+                    break
+                buf = buf[i + 8:]
+                skip = False
+                continue
+
+            i = buf.find(b'<array')
+            if i < 0:
+                if eof:
+                    yield buf
+                    buf = b''
+                elif len(buf) > 5:
+                    yield buf[:-5]
+                    buf = buf[-5:]
+                break
+            j = buf.find(b'>', i)
+            if j < 0:
+                if i:
+                    yield buf[:i]
+                    buf = buf[i:]
+                if eof:
+                    yield buf
+                    buf = b''
+                break
+
+            tag = buf[i:j + 1]
+            if tag[6:7] in b' \t\r\n>/' and not _wanted(tag):
+                yield buf[:i]
+                skip = not tag.endswith(b'/>')
+            else:
+                yield buf[:j + 1]
+            buf = buf[j + 1:]
 
 
 class XML(Input):
     def process(self, file):
-        dom = minidom.parse(file)
-        datasets = []
-        for array in dom.getElementsByTagName('array'):
-            if process_dataset and not array.getAttribute('name') in process_dataset:
-                continue
+        """XML.process(file) -> [ Dataset, ... ]
+
+        Parse the DSC XML `file`, which can be a filename or a binary file
+        object, and return the `Dataset`'s found in it. Compressed files are
+        decompressed as they are read, see `open_file()`."""
+        if isinstance(file, str):
+            with open_file(file) as f:
+                return self.process(f)
+
+        state = _Parser()
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = state.start
+        parser.EndElementHandler = state.end
+
+        if process_dataset:
+            for data in _filter(file):
+                parser.Parse(data, False)
+        else:
+            while True:
+                data = file.read(_read_size)
+                if not data:
+                    break
+                parser.Parse(data, False)
+        parser.Parse(b'', True)
 
-            dataset = Dataset()
-            dataset.name = array.getAttribute('name')
-            dataset.start_time = int(array.getAttribute('start_time'))
-            dataset.stop_time = int(array.getAttribute('stop_time'))
-
-            dimensions = [None, None]
-            for dimension in array.getElementsByTagName('dimension'):
-                if dimension.getAttribute('number') == '1':
-                    if dimensions[0]:
-                        logging.warning('Overwriting dimension 1 for %s' % dataset.name)
-                    dimensions[0] = dimension.getAttribute('type')
-                elif dimension.getAttribute('number') == '2':
-                    if dimensions[1]:
-                        logging.warning('Overwriting dimension 2 for %s' % dataset.name)
-                    dimensions[1] = dimension.getAttribute('type')
-                else:
-                    logging.warning('Invalid dimension number %r for %s' % (dimension.getAttribute('number'), dataset.name))
-
-            for node1 in array.getElementsByTagName(dimensions[0]):
-                d1 = Dimension(dimensions[0])
-                d1.value = node1.getAttribute('val')
-                try:
-                    if node1.getAttribute('base64'):
-                        d1.value = base64.b64decode(d1.value).decode('utf-8')
-                except Exception as e:
-                    pass
-                dataset.dimensions.append(d1)
-
-                d2 = Dimension(dimensions[1])
-                d1.dimensions.append(d2)
-                for node2 in node1.getElementsByTagName(dimensions[1]):
-                    val = node2.getAttribute('val')
-                    try:
-                        if node2.getAttribute('base64'):
-                            val = base64.b64decode(val).decode('utf-8')
-                    except Exception as e:
-                        pass
-                    d2.values[val] = int(node2.getAttribute('count'))
-
-            datasets.append(dataset)
-
-        return datasets
+        return state.datasets
 
 
 import sys
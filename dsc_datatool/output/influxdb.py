@@ -9,49 +9,209 @@ Part of dsc_datatool.
 
 import re
 import sys
+import logging
 import atexit
+import functools
+import time
 
-from dsc_datatool import Output, args, encoding
+from dsc_datatool import Output, LineBuffer, Escaper, args, encoding, node_of, labeled_values
 
 
-_re = re.compile(r'([,=\\\s])')
+_escape = Escaper(r'[,=\\\s]')
+_val = _escape.value
+_name = _escape.name
+_label = _escape.label
 
 
-def _key(key):
-    return re.sub(_re, r'\\\1', key)
+_field_re = re.compile(r'[,=\\\s]')
 
 
-def _val(val):
-    ret = re.sub(_re, r'\\\1', val)
-    if ret == '':
-        return '""'
-    return ret
+@functools.lru_cache(maxsize=Escaper.cache_size)
+def _field_underscore(key):
+    return re.sub(_field_re, '_', key) or '_'
 
 
-def _process(tags, timestamp, dimension, fh):
-    if dimension.dimensions is None:
-        return
+_field_escape = {
+    'backslash': _val,
+    'underscore': _field_underscore,
+}
 
-    if len(dimension.dimensions) > 0:
-        if not (dimension.name == 'All' and dimension.value == 'ALL'):
-            tags += ',%s=%s' % (_key(dimension.name.lower()), _val(dimension.value))
-        for d2 in dimension.dimensions:
-            _process(tags, timestamp, d2, fh)
-        return
 
-    if dimension.values is None:
-        return
+class _HTTPWriter(object):
+    """File object like writer that POSTs the line protocol written to it
+    to the InfluxDB HTTP API in batches of at most `batch_lines` lines and
+    `batch_bytes` bytes, using one connection that is kept alive.
 
-    if len(dimension.values) > 0:
-        tags += ',%s=' % _key(dimension.name.lower())
+    Failed requests are retried `retries` times with an exponential
+    backoff if the connection failed or InfluxDB responded with 429 or a
+    5xx status."""
+    location = None
+    scheme = None
+    netloc = None
+    path = None
+    headers = None
+    gzip = False
+    batch_lines = 5000
+    batch_bytes = 1048576
+    retries = 3
+    backoff = 0.5
+    timeout = 10
+    conn = None
+    pending = None
+    lines = 0
+    size = 0
 
-        for k, v in dimension.values.items():
-            print('%s%s value=%s %s' % (tags, _val(k), v, timestamp), file=fh)
+
+    def __init__(self, url, opts):
+        import urllib.parse
+
+        u = urllib.parse.urlsplit(url)
+        # the URL is never kept or shown with the credentials in it
+        self.netloc = u.netloc.rpartition('@')[2]
+        if not u.scheme in ('http', 'https') or not u.hostname:
+            raise Exception('invalid url %r' % u._replace(netloc=self.netloc).geturl())
+        self.scheme = u.scheme
+
+        api = opts.get('api', None)
+        if api is None:
+            api = 'bucket' in opts and '2' or '1'
+        self.headers = { 'Content-Type': 'text/plain; charset=utf-8' }
+        if api == '1':
+            if not 'database' in opts:
+                raise Exception('database must be given with url')
+            query = { 'db': opts['database'], 'precision': 'ns' }
+            if 'rp' in opts:
+                query['rp'] = opts['rp']
+            if 'username' in opts:
+                query['u'] = opts['username']
+                query['p'] = opts.get('password', '')
+            endpoint = '/write'
+        elif api == '2':
+            if not 'bucket' in opts:
+                raise Exception('bucket must be given with url and api=2')
+            query = { 'bucket': opts['bucket'] }
+            if 'org' in opts:
+                query['org'] = opts['org']
+            query['precision'] = 'ns'
+            endpoint = '/api/v2/write'
+        else:
+            raise Exception('api option invalid')
+        if 'token' in opts:
+            self.headers['Authorization'] = 'Token %s' % opts['token']
+        elif u.username is not None:
+            import base64
+            credentials = '%s:%s' % (urllib.parse.unquote(u.username), urllib.parse.unquote(u.password or ''))
+            self.headers['Authorization'] = 'Basic %s' % base64.b64encode(credentials.encode(encoding)).decode('ascii')
+        self.path = '%s%s?%s' % (u.path.rstrip('/'), endpoint, urllib.parse.urlencode(query))
+        # without the query, it can have the password
+        self.location = '%s://%s%s%s' % (self.scheme, self.netloc, u.path.rstrip('/'), endpoint)
+
+        if opts.get('gzip', False):
+            self.gzip = True
+            self.headers['Content-Encoding'] = 'gzip'
+        for opt in ('batch_lines', 'batch_bytes', 'retries'):
+            if opt in opts:
+                setattr(self, opt, int(opts[opt]))
+        for opt in ('backoff', 'timeout'):
+            if opt in opts:
+                setattr(self, opt, float(opts[opt]))
+        if self.batch_lines < 1 or self.batch_bytes < 1 or self.retries < 0:
+            raise Exception('batch_lines, batch_bytes and retries option invalid')
+
+        self.pending = []
+
+
+    def write(self, s):
+        data = s.encode(encoding)
+        lines = data.count(b'\n')
+        if lines > self.batch_lines or len(data) > self.batch_bytes:
+            for line in data.splitlines(True):
+                self._add(line, 1)
+        else:
+            self._add(data, lines)
+
+
+    def _add(self, data, lines):
+        if self.pending and (self.lines + lines > self.batch_lines or self.size + len(data) > self.batch_bytes):
+            self.flush()
+        self.pending.append(data)
+        self.lines += lines
+        self.size += len(data)
+
+
+    def flush(self):
+        """Send what has been written, it is kept and sent again on the next
+        flush if it fails."""
+        if not self.pending:
+            return
+        body = b''.join(self.pending)
+        self.pending = [ body ]
+        self._send(body)
+        self.pending = []
+        self.lines = 0
+        self.size = 0
+
+
+    def close(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error('Unable to write %d lines: %s' % (self.lines, e))
+        finally:
+            self._disconnect()
+
+
+    def _connect(self):
+        if self.conn is None:
+            import http.client
+
+            if self.scheme == 'https':
+                self.conn = http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+            else:
+                self.conn = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+        return self.conn
+
+
+    def _disconnect(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+    def _send(self, body):
+        if self.gzip:
+            import gzip
+            body = gzip.compress(body)
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                conn = self._connect()
+                conn.request('POST', self.path, body, self.headers)
+                response = conn.getresponse()
+                data = response.read()
+            except Exception as e:
+                self._disconnect()
+                error = e
+                continue
+            if response.will_close:
+                self._disconnect()
+            if response.status in (200, 204):
+                return
+            error = 'HTTP %d %s: %s' % (response.status, response.reason, data[:200].decode(encoding, 'replace'))
+            if response.status != 429 and response.status < 500:
+                break
+        raise Exception('write to %s failed: %s' % (self.location, error))
 
 
 class InfluxDB(Output):
     start_timestamp = True
     fh = None
+    batch_lines = 65536
+    fields = None
+    field_key = None
 
 
     def __init__(self, opts):
@@ -63,8 +223,27 @@ class InfluxDB(Output):
             self.start_timestamp = False
         else:
             raise Exception('timestamp option invalid')
+        fields = opts.get('fields', None)
+        if fields is True:
+            self.fields = True
+        elif fields:
+            if not isinstance(fields, list):
+                fields = [ fields ]
+            self.fields = set(name for f in fields for name in f.split(','))
+        field_escape = opts.get('field_escape', 'backslash')
+        if not field_escape in _field_escape:
+            raise Exception('field_escape option invalid')
+        self.field_key = _field_escape[field_escape]
         file = opts.get('file', None)
         append = opts.get('append', False)
+        url = opts.get('url', None)
+        if url:
+            if file:
+                raise Exception('file and url can not be used together')
+            self.fh = _HTTPWriter(url, opts)
+            self.batch_lines = self.fh.batch_lines
+            atexit.register(self.close)
+            return
         if file:
             if append:
                 self.fh = open(file, 'a', encoding=encoding)
@@ -88,15 +267,26 @@ class InfluxDB(Output):
 
 
     def process(self, datasets):
-        for dataset in datasets:
-            tags = '%s,server=%s,node=%s' % (_key(dataset.name.lower()), args.server, args.node)
-            if self.start_timestamp:
-                timestamp = dataset.start_time * 1000000000
-            else:
-                timestamp = dataset.end_time * 1000000000
+        buffer = LineBuffer(self.fh, self.batch_lines)
+        try:
+            for dataset in datasets:
+                prefix = '%s,server=%s,node=%s' % (_name(dataset.name), args.server, node_of(dataset))
+                if self.start_timestamp:
+                    timestamp = ' %d' % (dataset.start_time * 1000000000)
+                else:
+                    timestamp = ' %d' % (dataset.stop_time * 1000000000)
+
+                if self.fields is True or (self.fields and dataset.name in self.fields):
+                    field_key = self.field_key
+                    buffer.extend([ '%s%s %s%s' % (prefix, labels, ','.join([ '%s=%s' % (field_key(k), v) for k, v in dimension.values.items() ]), timestamp)
+                        for labels, dimension in labeled_values(dataset.dimensions, _label) ])
+                    continue
 
-            for d in dataset.dimensions:
-                _process(tags, timestamp, d, self.fh)
+                for labels, dimension in labeled_values(dataset.dimensions, _label):
+                    tags = '%s%s,%s=' % (prefix, labels, _name(dimension.name))
+                    buffer.extend([ '%s%s value=%s%s' % (tags, _val(k), v, timestamp) for k, v in dimension.values.items() ])
+        finally:
+            buffer.flush()
 
 
 if sys.version_info[0] == 3 and sys.version_info[1] == 5: # pragma: no cover
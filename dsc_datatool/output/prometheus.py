@@ -7,34 +7,178 @@ Part of dsc_datatool.
 :copyright: 2024 OARC, Inc.
 """
 
-import re
+import os
 import sys
 import atexit
+import logging
 
-from dsc_datatool import Output, args, encoding
+from dsc_datatool import Output, LineBuffer, Escaper, args, encoding, node_of, labeled_values
 
 
-_re = re.compile(r'([\\\n"])')
+_escape = Escaper(r'[\\\n"]', '"%s"')
+_val = _escape.value
+_name = _escape.name
+_label = _escape.label
 
 
-def _key(key):
-    return re.sub(_re, r'\\\1', key)
+class _Metrics(object):
+    """The latest snapshot of the metrics
 
+    Keeps the series of the latest interval of each metric and node, which
+    are rendered grouped by metric with one HELP and TYPE line each when
+    flushed if they have changed.
+    """
 
-def _val(val):
-    ret = re.sub(_re, r'\\\1', val)
-    if ret == '':
-        return '""'
-    return '"%s"' % ret
+
+    def __init__(self):
+        # metric name: (dataset name, { node: (start time, { series: value }) })
+        self.metrics = {}
+        self.changed = False
+
+
+    def interval(self, name, dataset, node):
+        """Returns the dict to put the series of the dataset's interval in,
+        or None if a later interval has already been seen."""
+        if name not in self.metrics:
+            self.metrics[name] = (_name(dataset.name), {})
+        nodes = self.metrics[name][1]
+        latest = nodes.get(node, None)
+        if latest is not None:
+            if dataset.start_time < latest[0]:
+                return None
+            if dataset.start_time == latest[0]:
+                self.changed = True
+                return latest[1]
+        series = {}
+        nodes[node] = (dataset.start_time, series)
+        self.changed = True
+        return series
+
+
+    def render(self):
+        lines = []
+        for name in sorted(self.metrics):
+            dataset, nodes = self.metrics[name]
+            lines.append('# HELP %s DSC dataset %s' % (name, dataset))
+            lines.append('# TYPE %s gauge' % name)
+            for start_time, series in nodes.values():
+                lines.extend([ '%s %s' % kv for kv in series.items() ])
+        lines.append('')
+        return '\n'.join(lines)
+
+
+    def flush(self):
+        if self.changed:
+            self.publish(self.render())
+            self.changed = False
+
+
+    def close(self):
+        self.flush()
+
+
+class _Textfile(_Metrics):
+    """Publishes the metrics for node_exporter's textfile collector by
+    writing a temporary file and renaming it to the file."""
+
+
+    def __init__(self, file):
+        _Metrics.__init__(self)
+        self.file = os.path.abspath(file)
+
+
+    def publish(self, text):
+        import tempfile
+        fd, tmp = tempfile.mkstemp(prefix='.%s.' % os.path.basename(self.file), dir=os.path.dirname(self.file))
+        try:
+            with os.fdopen(fd, 'w', encoding=encoding) as f:
+                f.write(text)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.file)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+
+class _Exporter(_Metrics):
+    """Serves the metrics on /metrics over HTTP
+
+    The body is rendered, and compressed if `gzip`, once when published and
+    the same bytes are given to every scrape until the next.
+    """
+
+
+    def __init__(self, listen, gzip=False):
+        import http.server
+        import socket
+        import socketserver
+        import threading
+        _Metrics.__init__(self)
+        self.gzip = gzip
+        self.body = (b'', None)
+        address, _, port = listen.rpartition(':')
+        try:
+            port = int(port)
+        except ValueError:
+            raise Exception('invalid listen %r' % listen)
+        exporter = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body, gzipped = exporter.body
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                if gzipped is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzipped
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+
+            def log_message(self, format, *args):
+                logging.debug('Prometheus %s %s' % (self.address_string(), format % args))
+
+        address = address.strip('[]')
+
+        # http.server.ThreadingHTTPServer is only in Python 3.7+
+        class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+            daemon_threads = True
+            address_family = ':' in address and socket.AF_INET6 or socket.AF_INET
+
+        self.server = Server((address, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='Prometheus', daemon=True).start()
+        logging.info('Prometheus serving /metrics on %s port %d' % self.server.server_address[:2])
+
+
+    def publish(self, text):
+        body = text.encode(encoding)
+        gzipped = None
+        if self.gzip:
+            import gzip
+            gzipped = gzip.compress(body)
+        # replaced as one so a scrape never mixes two snapshots
+        self.body = (body, gzipped)
+
+
+    def close(self):
+        _Metrics.close(self)
+        self.server.shutdown()
+        self.server.server_close()
 
 
 class Prometheus(Output):
     show_timestamp = True
     start_timestamp = True
     fh = None
-    type_def = ''
-    type_printed = False
     prefix = ''
+    metrics = None
 
 
     def __init__(self, opts):
@@ -50,7 +194,21 @@ class Prometheus(Output):
             raise Exception('timestamp option invalid')
         file = opts.get('file', None)
         append = opts.get('append', False)
-        if file:
+        textfile = opts.get('textfile', None)
+        listen = opts.get('listen', None)
+        if textfile or listen:
+            if file or append or (textfile and listen):
+                raise Exception('textfile and listen can not be used together or with file or append')
+            # neither the textfile collector nor the latest snapshot have
+            # timestamps
+            self.show_timestamp = False
+            if textfile:
+                self.metrics = _Textfile(textfile)
+            else:
+                self.metrics = _Exporter(listen, opts.get('gzip', False))
+            self.fh = self.metrics
+            atexit.register(self.close)
+        elif file:
             if append:
                 self.fh = open(file, 'a', encoding=encoding)
             else:
@@ -67,45 +225,44 @@ class Prometheus(Output):
             self.fh = None
 
 
-    def _process(self, tags, timestamp, dimension, fh):
-        if dimension.dimensions is None:
-            return
-
-        if len(dimension.dimensions) > 0:
-            if not (dimension.name == 'All' and dimension.value == 'ALL'):
-                tags += ',%s=%s' % (_key(dimension.name.lower()), _val(dimension.value))
-            for d2 in dimension.dimensions:
-                self._process(tags, timestamp, d2, fh)
-            return
-
-        if dimension.values is None:
+    def process(self, datasets):
+        if self.metrics:
+            self._metrics(datasets)
             return
 
-        if len(dimension.values) > 0:
-            tags += ',%s=' % _key(dimension.name.lower())
-
-            for k, v in dimension.values.items():
-                if not self.type_printed:
-                    print(self.type_def, file=fh)
-                    self.type_printed = True
-                if self.show_timestamp:
-                    print('%s%s} %s %s' % (tags, _val(k), v, timestamp), file=fh)
+        buffer = LineBuffer(self.fh)
+        try:
+            for dataset in datasets:
+                type_def = '# TYPE %s gauge' % _name(dataset.name)
+                prefix = '%s%s{server=%s,node=%s' % (self.prefix, _name(dataset.name), _val(args.server), _val(node_of(dataset)))
+                if not self.show_timestamp:
+                    timestamp = ''
+                elif self.start_timestamp:
+                    timestamp = ' %d' % (dataset.start_time * 1000)
                 else:
-                    print('%s%s} %s' % (tags, _val(k), v), file=fh)
+                    timestamp = ' %d' % (dataset.stop_time * 1000)
 
+                for labels, dimension in labeled_values(dataset.dimensions, _label):
+                    if type_def:
+                        buffer.append(type_def)
+                        type_def = None
+                    tags = '%s%s,%s=' % (prefix, labels, _name(dimension.name))
+                    buffer.extend([ '%s%s} %s%s' % (tags, _val(k), v, timestamp) for k, v in dimension.values.items() ])
+        finally:
+            buffer.flush()
 
-    def process(self, datasets):
-        for dataset in datasets:
-            self.type_def = '# TYPE %s gauge' % _key(dataset.name.lower())
-            self.type_printed = False
-            tags = '%s%s{server=%s,node=%s' % (self.prefix, _key(dataset.name.lower()), _val(args.server), _val(args.node))
-            if self.start_timestamp:
-                timestamp = dataset.start_time * 1000
-            else:
-                timestamp = dataset.end_time * 1000
 
-            for d in dataset.dimensions:
-                self._process(tags, timestamp, d, self.fh)
+    def _metrics(self, datasets):
+        for dataset in datasets:
+            name = '%s%s' % (self.prefix, _name(dataset.name))
+            node = node_of(dataset)
+            series = self.metrics.interval(name, dataset, node)
+            if series is None:
+                continue
+            prefix = '%s{server=%s,node=%s' % (name, _val(args.server), _val(node))
+            for labels, dimension in labeled_values(dataset.dimensions, _label):
+                tags = '%s%s,%s=' % (prefix, labels, _name(dimension.name))
+                series.update([ ('%s%s}' % (tags, _val(k)), v) for k, v in dimension.values.items() ])
 
 
 if sys.version_info[0] == 3 and sys.version_info[1] == 5: # pragma: no cover
@@ -8,13 +8,20 @@ Part of dsc_datatool.
 """
 
 import ipaddress
+import functools
+import socket
 
 from dsc_datatool import Transformer, args
 
 
+_cache_size = 65536
+
+
 class NetRemap(Transformer):
     v4net = None
     v6net = None
+    v4mask = None
+    v6mask = None
     nonstrict = False
 
 
@@ -32,6 +39,32 @@ class NetRemap(Transformer):
         if opts.get('nonstrict', False):
             self.nonstrict = True
 
+        self.v4mask = int(ipaddress.IPv4Network('0.0.0.0/%s' % self.v4net).netmask)
+        self.v6mask = int(ipaddress.IPv6Network('::/%s' % self.v6net).netmask)
+        self._new_key = functools.lru_cache(maxsize=_cache_size)(self._new_key)
+
+
+    def _new_key(self, k):
+        """Returns the network address of `k`, the result is cached since
+        the same addresses often shows up in many intervals.
+
+        Plain IPv4 and IPv6 addresses are parsed with `inet_pton()` which is
+        a lot faster than `ipaddress`, anything else is left to `ipaddress`
+        to decide on."""
+        try:
+            if ':' in k:
+                ip = int.from_bytes(socket.inet_pton(socket.AF_INET6, k), 'big')
+                return str(ipaddress.IPv6Address(ip & self.v6mask))
+            ip = int.from_bytes(socket.inet_pton(socket.AF_INET, k), 'big')
+            return socket.inet_ntop(socket.AF_INET, (ip & self.v4mask).to_bytes(4, 'big'))
+        except (OSError, ValueError):
+            pass
+
+        ip = ipaddress.ip_address(k)
+        if ip.version == 4:
+            return str(ipaddress.IPv4Network('%s/%s' % (ip, self.v4net), strict=False).network_address)
+        return str(ipaddress.IPv6Network('%s/%s' % (ip, self.v6net), strict=False).network_address)
+
 
     def _process(self, dimension):
         if not dimension.values:
@@ -40,30 +73,26 @@ class NetRemap(Transformer):
             return
 
         values = dimension.values
-        dimension.values = {}
+        dimension.values = new_values = {}
 
         for k, v in values.items():
             if k == args.skipped_key:
                 continue
             elif k == args.skipped_sum_key:
-                dimension.values['0'] = v
+                new_values['0'] = v
                 continue
 
             try:
-                ip = ipaddress.ip_address(k)
+                nkey = self._new_key(k)
             except Exception as e:
                 if not self.nonstrict:
                     raise e
                 continue
-            if ip.version == 4:
-                nkey = str(ipaddress.IPv4Network('%s/%s' % (ip, self.v4net), strict=False).network_address)
-            else:
-                nkey = str(ipaddress.IPv6Network('%s/%s' % (ip, self.v6net), strict=False).network_address)
 
-            if not nkey in dimension.values:
-                dimension.values[nkey] = v
+            if not nkey in new_values:
+                new_values[nkey] = v
             else:
-                dimension.values[nkey] += v
+                new_values[nkey] += v
 
 
     def process(self, datasets):
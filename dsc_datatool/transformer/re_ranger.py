@@ -8,11 +8,13 @@ Part of dsc_datatool.
 """
 
 import re
+import functools
 
 from dsc_datatool import Transformer, args
 
 
 _key_re = re.compile(r'^(?:(\d+)|(\d+)-(\d+))$')
+_cache_size = 65536
 
 
 class ReRanger(Transformer):
@@ -46,33 +48,55 @@ class ReRanger(Transformer):
         if self.func != 'sum':
             raise Exception('invalid func %r' % self.func)
 
+        self._new_key = functools.lru_cache(maxsize=_cache_size)(self._new_key)
 
-    def _process(self, dimension):
+
+    def _new_key(self, k):
+        """Returns the key of the range that `k` belongs to or None if `k` is
+        not a valid key, the result is cached since the same keys shows up
+        in every interval."""
         global _key_re
 
+        m = _key_re.match(k)
+        if not m:
+            return None
+
+        low, low2, high = m.group(1, 2, 3)
+        if high is None:
+            low = int(low)
+            high = low
+        else:
+            low = int(low2)
+            high = int(high)
+
+        if self.key == 'low':
+            nkey = low
+        elif self.key == 'mid':
+            nkey = int(low + ( (high - low) / 2 ))
+        else:
+            nkey = high
+
+        nkey = int(nkey / self.split_by) * self.split_by
+        low = nkey
+        high = nkey + self.split_by - 1
+
+        if low != high:
+            return '%d-%d' % (low, high)
+        return str(nkey)
+
+
+    def _process(self, dimension):
         if not dimension.values:
             for d2 in dimension.dimensions:
                 self._process(d2)
             return
 
         values = dimension.values
-        dimension.values = {}
+        dimension.values = new_values = {}
         skipped = None
 
         for k, v in values.items():
-            low = None
-            high = None
-
-            m = _key_re.match(k)
-            if m:
-                low, low2, high = m.group(1, 2, 3)
-                if high is None:
-                    low = int(low)
-                    high = low
-                else:
-                    low = int(low2)
-                    high = int(high)
-            elif k == args.skipped_key:
+            if k == args.skipped_key:
                 continue
             elif k == args.skipped_sum_key:
                 if skipped is None:
@@ -80,36 +104,19 @@ class ReRanger(Transformer):
                 else:
                     skipped += v
                 continue
-            elif self.allow_invalid_keys:
-                dimension.values[k] = v
-                continue
-            else:
-                raise Exception('invalid key %r' % k)
 
-            if self.key == 'low':
-                nkey = low
-            elif self.key == 'mid':
-                nkey = int(low + ( (high - low) / 2 ))
+            nkey = self._new_key(k)
+            if nkey is None:
+                if not self.allow_invalid_keys:
+                    raise Exception('invalid key %r' % k)
+                new_values[k] = v
+            elif nkey in new_values:
+                new_values[nkey] += v
             else:
-                nkey = high
-
-            nkey = int(nkey / self.split_by) * self.split_by
-            low = nkey
-            high = nkey + self.split_by - 1
-
-            if self.func == 'sum':
-                if low != high:
-                    nkey = '%d-%d' % (low, high)
-                else:
-                    nkey = str(nkey)
-
-                if nkey in dimension.values:
-                    dimension.values[nkey] += v
-                else:
-                    dimension.values[nkey] = v
+                new_values[nkey] = v
 
         if skipped:
-            dimension.values['skipped'] = skipped
+            new_values['skipped'] = skipped
 
 
     def process(self, datasets):
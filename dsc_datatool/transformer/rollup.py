@@ -0,0 +1,90 @@
+"""dsc_datatool.transformer.rollup
+
+See `man dsc-datatool-transformer rollup`.
+
+Part of dsc_datatool.
+
+:copyright: 2024 OARC, Inc.
+"""
+
+import re
+import logging
+
+from dsc_datatool import Transformer, node_of
+
+
+_units = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+}
+
+
+class Rollup(Transformer):
+    interval = None
+    open = 2
+    windows = None
+
+
+    def __init__(self, opts):
+        Transformer.__init__(self, opts)
+        interval = opts.get('interval', None)
+
+        if interval is None:
+            raise Exception('interval must be given')
+        m = re.match(r'^(\d+)([smhd]?)$', interval)
+        if m is None:
+            raise Exception('invalid interval %r' % interval)
+        self.interval = int(m.group(1)) * _units[m.group(2) or 's']
+        if self.interval < 1:
+            raise Exception('invalid interval %r' % interval)
+
+        count = opts.get('open', None)
+        if count is not None:
+            if not re.match(r'^\d+$', count) or int(count) < 1:
+                raise Exception('invalid open %r' % count)
+            self.open = int(count)
+
+        # (node, name): { start time: dataset }
+        self.windows = {}
+
+
+    def process(self, datasets):
+        done = []
+
+        for dataset in datasets:
+            start_time = dataset.start_time - dataset.start_time % self.interval
+            windows = self.windows.setdefault((node_of(dataset), dataset.name), {})
+            window = windows.get(start_time, None)
+            if window is not None:
+                window.merge(dataset)
+                continue
+
+            dataset.start_time = start_time
+            dataset.stop_time = start_time + self.interval
+            if len(windows) >= self.open and start_time < min(windows):
+                # the interval has already been given on, this part of it
+                # will be given on by itself
+                logging.warning('Interval %d of %s is no longer open, it will be given on partially' % (start_time, dataset.name))
+                done.append(dataset)
+                continue
+
+            windows[start_time] = dataset
+            if len(windows) > self.open:
+                done.append(windows.pop(min(windows)))
+
+        datasets[:] = done
+
+
+    def flush(self):
+        done = []
+        for windows in self.windows.values():
+            done += [ windows[start_time] for start_time in sorted(windows) ]
+        self.windows = {}
+        return done
+
+
+import sys
+if sys.version_info[0] == 3 and sys.version_info[1] == 5: # pragma: no cover
+    Transformer.__init_subclass__(Rollup)
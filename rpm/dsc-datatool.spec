@@ -76,6 +76,7 @@ install -m644 man/man7/dsc-datatool-output-influxdb.7 %{buildroot}%{_mandir}/man
 install -m644 man/man7/dsc-datatool-output-prometheus.7 %{buildroot}%{_mandir}/man7/
 install -m644 man/man7/dsc-datatool-transformer-labler.7 %{buildroot}%{_mandir}/man7/
 install -m644 man/man7/dsc-datatool-transformer-netremap.7 %{buildroot}%{_mandir}/man7/
+install -m644 man/man7/dsc-datatool-transformer-rollup.7 %{buildroot}%{_mandir}/man7/
 
 
 %files
@@ -0,0 +1,38 @@
+import sys
+import pytest
+import dsc_datatool
+from dsc_datatool import Dataset, Dimension
+
+
+def _dataset(values, name='qtype', start_time=1563520560, node=None, value='ALL'):
+    o = Dataset()
+    o.name = name
+    o.start_time = start_time
+    o.stop_time = start_time + 60
+    if node:
+        o.node = node
+    d1 = Dimension('All')
+    d1.value = value
+    o.dimensions.append(d1)
+    d2 = Dimension('Qtype')
+    d2.values = dict(values)
+    d1.dimensions.append(d2)
+    return o
+
+
+@pytest.fixture
+def dataset():
+    """Returns a function that makes a `Dataset` with an All dimension and
+    the given values in a Qtype dimension under it."""
+    return _dataset
+
+
+@pytest.fixture
+def args():
+    """Sets the server and node, main() replaces `args` so it is set on the
+    one in dsc_datatool and the ones the plugins have imported."""
+    for module in list(sys.modules.values()):
+        if getattr(module, '__name__', '').startswith('dsc_datatool') and hasattr(module, 'args'):
+            module.args.server = 'test-server'
+            module.args.node = 'test-node'
+    return dsc_datatool.args
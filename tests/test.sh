@@ -73,3 +73,333 @@ dsc-datatool \
 
 sort -s "$base/test.gold4" > "$base/test.gold4.tmp"
 diff -u "$base/test.gold4.tmp" "$base/test.out"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --transform ";Labler;*;yaml=$base/labler.yaml" \
+  --transform ";NetRemap;client_subnet,client_subnet2,client_addr_vs_rcode,ipv6_rsn_abusers;net=16" \
+  --generator ";client_subnet_authority;csv=$base/ipv4-address-space.csv;csv=$base/ipv6-unicast-address-assignments.csv" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --xml "$base/1458044657.xml" \
+  --xml "$base/utf8.xml" \
+  --dat "$base/20190719" > "$base/test.out"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --jobs 3 \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --transform ";Labler;*;yaml=$base/labler.yaml" \
+  --transform ";NetRemap;client_subnet,client_subnet2,client_addr_vs_rcode,ipv6_rsn_abusers;net=16" \
+  --generator ";client_subnet_authority;csv=$base/ipv4-address-space.csv;csv=$base/ipv6-unicast-address-assignments.csv" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --xml "$base/1458044657.xml" \
+  --xml "$base/utf8.xml" \
+  --dat "$base/20190719" > "$base/test.out.jobs"
+
+diff -u "$base/test.out" "$base/test.out.jobs"
+
+for batch in "--batch-size 3" "--batch-size 100 --batch-by dataset" "--batch-size 2 --jobs 3" "--pipeline" "--pipeline --batch-size 2 --queue-size 1"; do
+  dsc-datatool \
+    -vvv \
+    -s test-server \
+    -n test-node \
+    $batch \
+    --output ";InfluxDB;dml=1;database=dsc" \
+    --transform ";Labler;*;yaml=$base/labler.yaml" \
+    --transform ";NetRemap;client_subnet,client_subnet2,client_addr_vs_rcode,ipv6_rsn_abusers;net=16" \
+    --generator ";client_subnet_authority;csv=$base/ipv4-address-space.csv;csv=$base/ipv6-unicast-address-assignments.csv" \
+    --xml "$base/1563520620.dscdata.xml" \
+    --xml "$base/1458044657.xml" \
+    --xml "$base/utf8.xml" \
+    --dat "$base/20190719" > "$base/test.out.batch"
+  diff -u "$base/test.out" "$base/test.out.batch"
+done
+
+rm -f "$base/test.state"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --state "$base/test.state" \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --dat "$base/20190719" \
+  --xml "$base/1563520620.dscdata.xml" | sort -s > "$base/test.out"
+test -s "$base/test.out"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --state "$base/test.state" \
+  --output ";InfluxDB" \
+  --dat "$base/20190719" \
+  --xml "$base/1563520620.dscdata.xml" > "$base/test.out"
+test ! -s "$base/test.out"
+rm -f "$base/test.state"
+
+# held back datasets are not recorded in the state if the run fails
+tmp=`mktemp -d`
+cp "$base/1563520620.dscdata.xml" "$tmp/"
+cp "$base/broken.xml" "$tmp/9999999999.xml"
+if dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --state "$base/test.state" \
+  --output ";InfluxDB" \
+  --transform ";Rollup;qtype;interval=5m" \
+  --xml "$tmp" > "$base/test.out"; then
+  exit 1
+fi
+rm "$tmp/9999999999.xml"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --state "$base/test.state" \
+  --output ";InfluxDB" \
+  --transform ";Rollup;qtype;interval=5m" \
+  --xml "$tmp" > "$base/test.out"
+grep -q '^qtype,' "$base/test.out"
+rm -f "$base/test.state"
+cp "$base/broken.xml" "$tmp/9999999999.xml"
+if dsc-datatool \
+  -vvv \
+  -s test-server \
+  --state "$base/test.state" \
+  --output ";InfluxDB" \
+  --aggregate-node all \
+  --node-xml node1 "$tmp" \
+  --node-dat node2 "$base/20190719" > "$base/test.out"; then
+  exit 1
+fi
+rm "$tmp/9999999999.xml"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  --state "$base/test.state" \
+  --output ";InfluxDB" \
+  --aggregate-node all \
+  --node-xml node1 "$tmp" \
+  --node-dat node2 "$base/20190719" > "$base/test.out"
+grep -q ',node=node1,' "$base/test.out"
+grep -q ',node=all,' "$base/test.out"
+rm -rf "$tmp" "$base/test.state"
+
+tmp=`mktemp -d`
+gzip -c "$base/1563520620.dscdata.xml" > "$tmp/1563520620.dscdata.xml.gz"
+bzip2 -c "$base/1563520620.dscdata.xml" > "$tmp/1563520620.dscdata.xml.bz2"
+tar -C "$base" -czf "$tmp/archive.tgz" 1563520620.dscdata.xml
+mkdir "$tmp/dat"
+for file in "$base/20190719/"*.dat; do
+  xz -c "$file" > "$tmp/dat/`basename "$file"`.xz"
+done
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --transform ";Labler;*;yaml=$base/labler.yaml" \
+  --transform ";ReRanger;rcode_vs_replylen;range=/64;pad_to=5" \
+  --transform ";ReRanger;qtype_vs_qnamelen;range=/16;pad_to=3" \
+  --transform ";ReRanger;client_port_range;key=low;range=/2048;pad_to=5" \
+  --transform ";ReRanger;edns_bufsiz,priming_queries;key=low;range=/512;pad_to=5;allow_invalid_keys=1" \
+  --transform ";ReRanger;priming_responses;key=low;range=/128;pad_to=4" \
+  --transform ";NetRemap;client_subnet,client_subnet2,client_addr_vs_rcode,ipv6_rsn_abusers;net=16" \
+  --generator ";client_subnet_authority;csv=$base/ipv4-address-space.csv;csv=$base/ipv6-unicast-address-assignments.csv" \
+  --xml "$tmp/1563520620.dscdata.xml.gz" | sort -s > "$base/test.out"
+diff -u "$base/test.gold.tmp" "$base/test.out"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --transform ";Labler;*;yaml=$base/labler.yaml" \
+  --transform ";ReRanger;rcode_vs_replylen;range=/64;pad_to=5" \
+  --transform ";ReRanger;qtype_vs_qnamelen;range=/16;pad_to=3" \
+  --transform ";ReRanger;client_port_range;key=low;range=/2048;pad_to=5" \
+  --transform ";ReRanger;edns_bufsiz,priming_queries;key=low;range=/512;pad_to=5;allow_invalid_keys=1" \
+  --transform ";ReRanger;priming_responses;key=low;range=/128;pad_to=4" \
+  --transform ";NetRemap;client_subnet,client_subnet2,client_addr_vs_rcode,ipv6_rsn_abusers;net=16" \
+  --generator ";client_subnet_authority;csv=$base/ipv4-address-space.csv;csv=$base/ipv6-unicast-address-assignments.csv" \
+  --xml "$tmp/archive.tgz" | sort -s > "$base/test.out"
+diff -u "$base/test.gold.tmp" "$base/test.out"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --transform ";Labler;*;yaml=$base/labler.yaml" \
+  --transform ";ReRanger;rcode_vs_replylen;range=/64;pad_to=5" \
+  --transform ";ReRanger;qtype_vs_qnamelen;range=/16;pad_to=3" \
+  --transform ";ReRanger;client_port_range;key=low;range=/2048;pad_to=5" \
+  --transform ";ReRanger;edns_bufsiz,priming_queries;key=low;range=/512;pad_to=5;allow_invalid_keys=1" \
+  --transform ";ReRanger;priming_responses;key=low;range=/128;pad_to=4" \
+  --transform ";NetRemap;client_subnet,client_subnet2,client_addr_vs_rcode,ipv6_rsn_abusers;net=16" \
+  --generator ";client_subnet_authority;csv=$base/ipv4-address-space.csv;csv=$base/ipv6-unicast-address-assignments.csv" \
+  --xml "$tmp" | grep -v '^#' | sort -s > "$base/test.out"
+grep -v '^#' "$base/test.gold.tmp" | sed 'p;p' | sort -s | diff -u - "$base/test.out"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --transform ";Labler;*;yaml=$base/labler.yaml" \
+  --transform ";ReRanger;rcode_vs_replylen;range=/64;pad_to=5" \
+  --transform ";ReRanger;qtype_vs_qnamelen;range=/16;pad_to=3" \
+  --transform ";ReRanger;client_port_range;key=low;range=/2048;pad_to=5" \
+  --transform ";ReRanger;edns_bufsiz,priming_queries;key=low;range=/512;pad_to=5;allow_invalid_keys=1" \
+  --transform ";ReRanger;priming_responses;key=low;range=/128;pad_to=4" \
+  --transform ";NetRemap;client_subnet,client_subnet2,client_addr_vs_rcode,ipv6_rsn_abusers;net=16" \
+  --generator ";client_subnet_authority;csv=$base/ipv4-address-space.csv;csv=$base/ipv6-unicast-address-assignments.csv" \
+  --dat "$tmp/dat" | sort -s > "$base/test.out"
+diff -u "$base/test.gold2.tmp" "$base/test.out"
+
+rm -rf "$tmp"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB;dml=1;database=dsc" \
+  --transform ";Labler;*;yaml=$base/labler.yaml" \
+  --transform ";NetRemap;client_subnet2;net=16" \
+  --dataset qtype,rcode \
+  --dataset client_subnet2 \
+  --xml "$base/1563520620.dscdata.xml" | grep -v '^#' | sort -s > "$base/test.out"
+grep -E '^(qtype|rcode|client_subnet2),' "$base/test.gold.tmp" | diff -u - "$base/test.out"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --dat "$base/20190719" > "$base/test.out"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --start 2019-07-19T07:16:00 \
+  --stop 1563520620 \
+  --output ";InfluxDB" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --xml "$base/1458044657.xml" \
+  --xml "$base/utf8.xml" \
+  --dat "$base/20190719" > "$base/test.out.range"
+diff -u "$base/test.out" "$base/test.out.range"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --start 1563520620 \
+  --output ";InfluxDB" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --xml "$base/1458044657.xml" \
+  --dat "$base/20190719" > "$base/test.out"
+test ! -s "$base/test.out"
+
+tmp=`mktemp -d`
+for name in qtype rcode pcap_stats; do
+  grep -v '^#' "$base/20190719/$name.dat" | awk '{ for (i = 0; i < 3; i++) { $1 = 1563520680 + i * 60; print } }' > "$tmp/$name.dat"
+done
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB" \
+  --dataset qtype,rcode,pcap_stats \
+  --dat "$base/20190719" | awk '{ split($2, v, "="); print $1, "value=" v[2] * 3, "1563520680000000000" }' | sort -s > "$base/test.gold.rollup"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB" \
+  --transform ";Rollup;*;interval=3m" \
+  --dat "$tmp" | sort -s > "$base/test.out"
+diff -u "$base/test.gold.rollup" "$base/test.out"
+rm -rf "$tmp" "$base/test.gold.rollup"
+
+# XML files not in time order, the directory is scanned in any order
+tmp=`mktemp -d`
+for i in 7 2 9 0 5 3 8 1 6 4; do
+  start=`expr 1563520560 + $i \* 60`
+  sed "s/start_time=\"1563520560\" stop_time=\"1563520620\"/start_time=\"$start\" stop_time=\"`expr $start + 60`\"/" \
+    "$base/1563520620.dscdata.xml" > "$tmp/`expr $start + 60`.dscdata.xml"
+done
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB" \
+  --dataset qtype,rcode \
+  --xml "$base/1563520620.dscdata.xml" > "$base/test.out"
+awk '{ split($2, v, "="); print $1, "value=" v[2] * 4, "1563520200000000000"; print $1, "value=" v[2] * 6, "1563520800000000000" }' "$base/test.out" | sort -s > "$base/test.gold.rollup"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";InfluxDB" \
+  --dataset qtype,rcode \
+  --transform ";Rollup;*;interval=10m;open=1" \
+  --xml "$tmp" | sort -s > "$base/test.out"
+diff -u "$base/test.gold.rollup" "$base/test.out"
+rm -rf "$tmp" "$base/test.gold.rollup"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n all \
+  --output ";InfluxDB" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --dat "$base/20190719" | awk '{ sum[$1 " " $3] += substr($2, 7) } END { for (k in sum) { split(k, p, " "); print p[1], "value=" sum[k], p[2] } }' | sort -s > "$base/test.gold.aggregate"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  --output ";InfluxDB" \
+  --aggregate-node all \
+  --node-xml node1 "$base/1563520620.dscdata.xml" \
+  --node-xml node2 "$base/1563520620.dscdata.xml" \
+  --node-dat node3 "$base/20190719" > "$base/test.out"
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n node1 \
+  --output ";InfluxDB" \
+  --xml "$base/1563520620.dscdata.xml" | sort -s > "$base/test.out.node"
+grep ',node=node1,' "$base/test.out" | sort -s | diff -u "$base/test.out.node" -
+grep ',node=all,' "$base/test.out" | sort -s | diff -u "$base/test.gold.aggregate" -
+rm -f "$base/test.gold.aggregate"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --stats "$base/test.stats" \
+  --output ";InfluxDB" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --dat "$base/20190719" > "$base/test.out"
+test "`awk '$1 == "output" && $2 == "InfluxDB" { print $9 }' "$base/test.stats"`" = "`wc -l < "$base/test.out"`"
+test "`awk '$1 == "input" { sum += $9 } END { print sum }' "$base/test.stats"`" = "`wc -l < "$base/test.out"`"
+rm -f "$base/test.stats"
+
+dsc-datatool \
+  -vvv \
+  -s test-server \
+  -n test-node \
+  --output ";Prometheus;textfile=$base/test.prom" \
+  --xml "$base/1563520620.dscdata.xml" \
+  --dat "$base/20190719"
+test -z "`grep -v '^#' "$base/test.prom" | sed 's/ [^ ]*$//' | sort | uniq -d`"
+test -z "`grep '^# TYPE' "$base/test.prom" | sort | uniq -d`"
+test -z "`grep -v '^#' "$base/test.prom" | awk 'NF != 2'`"
+rm -f "$base/test.prom"
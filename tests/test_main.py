@@ -1,7 +1,79 @@
+import os
 import pytest
+import tracemalloc
 import dsc_datatool as app
+from dsc_datatool.input.dat import DAT
 
 
 def test_main():
     with pytest.raises(Exception):
         app.main()
+
+
+def test_plugins():
+    assert app._plugin('transformer', 'Rollup') is app.transformers['Rollup']
+    assert app._plugin('output', 'NoSuchOutput') is None
+    assert app._plugin_names('output')[:2] == [ 'InfluxDB', 'Prometheus' ]
+
+
+def test_state(tmp_path):
+    dat = os.path.join(os.path.dirname(os.path.abspath(__file__)), '20190719')
+    files = DAT().files(dat)
+    names = [ os.path.basename(file) for file in files ]
+    assert 'qtype.dat' in names
+    assert not 'qtype_vs_tld.dat' in names
+    assert not [ name for name in names if '_accum' in name ]
+
+    file = str(tmp_path / 'state')
+    state = app._State(file)
+    assert state.dat_grown(files)
+    input = DAT()
+    input.offsets = state.dat_pos(dat)
+    for datasets in input.stream(dat):
+        pass
+    state.update('DAT', dat, input.offsets)
+    assert not state.dat_grown(files)
+
+    # entries for files that are gone are removed when loaded
+    state.xml[str(tmp_path / 'gone.xml')] = [ 0, 0, 0 ]
+    state.save()
+    assert not str(tmp_path / 'gone.xml') in app._State(file).xml
+
+
+def test_aggregate(dataset):
+    def names(datasets):
+        return [ (d.name, d.start_time, d.node, d.dimensions[0].dimensions[0].values) for d in datasets ]
+
+    o = app._Aggregate('all', [ 'a', 'b' ])
+    assert names(o.process([ dataset({ '1': 1 }, node='a'), dataset({ '1': 2 }, name='rcode', node='a') ])) == []
+    assert names(o.process([ dataset({ '1': 3 }, node='b') ])) == [ ('qtype', 1563520560, 'all', { '1': 4 }) ]
+
+    # b never gives rcode, it is done once b has moved past it
+    assert names(o.process([ dataset({ '1': 1 }, start_time=1563520620, node='b') ])) == [ ('rcode', 1563520560, 'all', { '1': 2 }) ]
+    assert names(o.process([ dataset({ '1': 1 }, start_time=1563520620, node='a') ])) == [ ('qtype', 1563520620, 'all', { '1': 2 }) ]
+    assert o.flush() == []
+
+    # b is down
+    o = app._Aggregate('all', [ 'a', 'b' ], 120)
+    assert names(o.process([ dataset({ '1': 1 }, start_time=t, node='a') for t in (0, 60, 120) ])) == [
+        ('qtype', 0, 'all', { '1': 1 }) ]
+    assert len(o.flush()) == 2
+
+
+@pytest.mark.skipif(not hasattr(tracemalloc, 'reset_peak'), reason='needs tracemalloc.reset_peak()')
+def test_stats_memory():
+    tracemalloc.start()
+    try:
+        # what is already traced is not counted
+        baseline = [ bytearray(1024) for n in range(4096) ]
+        stats = app._Stats('-', 'json')
+        started = stats.start()
+        data = bytearray(1048576)
+        del data
+        stats.add(object(), started, [])
+        peak = list(stats.entries.values())[0]['peak_memory']
+        assert 1048576 <= peak < 2 * 1048576
+
+        assert app._Stats('-', 'json', False).start()[2] is None
+    finally:
+        tracemalloc.stop()
@@ -1,5 +1,6 @@
 import pytest
-from dsc_datatool import Dataset, Dimension, Input, Output, Generator, Transformer
+import io
+from dsc_datatool import Dataset, Dimension, Input, Output, Generator, Transformer, LineBuffer, Escaper, labeled_values
 
 
 def test_dataset():
@@ -7,15 +8,72 @@ def test_dataset():
     assert '%r' % o == '<Dataset name=None dimension=[]>'
 
 
+def test_dataset_merge(dataset):
+    o = dataset({ 'x': 1, 'y': 2 })
+    o.merge(dataset({ 'y': 3, 'z': 4 }))
+    assert len(o.dimensions) == 1
+    assert o.dimensions[0].dimensions[0].values == { 'x': 1, 'y': 5, 'z': 4 }
+
+    o2 = dataset({ 'x': 1 })
+    o2.dimensions[0].value = 'b'
+    o.merge(o2)
+    assert len(o.dimensions) == 2
+    assert o.dimensions[1].dimensions[0].values == { 'x': 1 }
+
+
 def test_dimension():
     o = Dimension('test')
     assert '%r' % o == '<Dimension name=\'test\' value=None dimension=[]>'
+    o.values['a'] = 1
+    assert o.values == { 'a': 1 }
+    assert len(o.dimensions) == 0
+    o.dimensions = [ Dimension('test2') ]
+    assert len(o.dimensions) == 1
+
+    # reading one before writing the other
+    o = Dimension('test')
+    if not o.dimensions:
+        o.values['a'] = 1
+    assert o.values == { 'a': 1 }
+    o = Dimension('test')
+    assert len(o.values) == 0
+    o.dimensions.append(Dimension('test2'))
+    assert len(o.dimensions) == 1
+
+
+def test_labeled_values():
+    all = Dimension('All')
+    all.value = 'ALL'
+    d1 = Dimension('d1')
+    d1.value = 'a'
+    all.dimensions.append(d1)
+    d2 = Dimension('d2')
+    d2.values = { 'x': 1 }
+    d1.dimensions.append(d2)
+    d1.dimensions.append(Dimension('empty'))
+
+    assert list(labeled_values([ all ], lambda name, value: ',%s=%s' % (name, value))) == [ (',d1=a', d2) ]
+
+
+def test_line_buffer():
+    fh = io.StringIO()
+    o = LineBuffer(fh, size=2)
+    o.append('a')
+    assert fh.getvalue() == ''
+    o.extend([ 'b', 'c' ])
+    assert fh.getvalue() == 'a\nb\nc\n'
+    o.flush()
+    o.append('d')
+    o.flush()
+    assert fh.getvalue() == 'a\nb\nc\nd\n'
 
 
 def test_input():
     o = Input()
     with pytest.raises(Exception):
         o.process("test")
+    with pytest.raises(Exception):
+        list(o.stream("test"))
 
     class Input1(Input):
         def process(self, file):
@@ -66,3 +124,16 @@ def test_transformer():
         class Transformer1(Transformer):
             def process(self, file):
                 pass
+
+
+def test_escaper():
+    o = Escaper(r'[,=\\\s]')
+    assert o.key('a b,c') == 'a\\ b\\,c'
+    assert o.value('') == '""'
+    assert o.name('QType') == 'qtype'
+    assert o.label('Qtype', 'a=b') == ',qtype=a\\=b'
+    assert o.label('Qtype', 'a=b') is o.label('Qtype', 'a=b')
+
+    o = Escaper(r'[\\\n"]', '"%s"')
+    assert o.value('a"b') == '"a\\"b"'
+    assert o.value('') == '""'
@@ -0,0 +1,75 @@
+import os
+import gzip
+import pytest
+import urllib.error
+import urllib.request
+from dsc_datatool.output.prometheus import Prometheus
+
+
+def test_textfile(tmp_path, args, dataset):
+    file = str(tmp_path / 'dsc.prom')
+    o = Prometheus({ 'textfile': file, 'prefix': 'dsc_' })
+    o.process([ dataset({ '1': 1, '2': 2 }, name='qtype', start_time=60), dataset({ '0': 5 }, name='rcode', start_time=60) ])
+    o.process([ dataset({ '1': 3 }, name='qtype', start_time=120), dataset({ '1': 4 }, name='qtype', start_time=0) ])
+    o.process([ dataset({ '28': 6 }, name='qtype', start_time=120), dataset({ '1': 7 }, name='qtype', start_time=0, node='other') ])
+    assert not os.path.exists(file)
+    o.fh.flush()
+    with open(file) as f:
+        assert f.read() == \
+            '# HELP dsc_qtype DSC dataset qtype\n' \
+            '# TYPE dsc_qtype gauge\n' \
+            'dsc_qtype{server="test-server",node="test-node",qtype="1"} 3\n' \
+            'dsc_qtype{server="test-server",node="test-node",qtype="28"} 6\n' \
+            'dsc_qtype{server="test-server",node="other",qtype="1"} 7\n' \
+            '# HELP dsc_rcode DSC dataset rcode\n' \
+            '# TYPE dsc_rcode gauge\n' \
+            'dsc_rcode{server="test-server",node="test-node",qtype="0"} 5\n'
+    assert oct(os.stat(file).st_mode & 0o777) == oct(0o644)
+
+    o.process([ dataset({ '3': 1 }, name='rcode', start_time=120) ])
+    o.close()
+    with open(file) as f:
+        assert f.read().endswith('dsc_rcode{server="test-server",node="test-node",qtype="3"} 1\n')
+    assert os.listdir(str(tmp_path)) == [ 'dsc.prom' ]
+
+    with pytest.raises(Exception):
+        Prometheus({ 'textfile': file, 'file': file })
+
+
+def test_listen(args, dataset):
+    o = Prometheus({ 'listen': '127.0.0.1:0', 'gzip': True })
+    url = 'http://127.0.0.1:%d' % o.metrics.server.server_address[1]
+
+    def get(path, headers={}):
+        with urllib.request.urlopen(urllib.request.Request(url + path, headers=headers)) as r:
+            return r.headers.get('Content-Encoding', None), r.read()
+
+    assert get('/metrics') == (None, b'')
+    o.process([ dataset({ '1': 1 }, name='qtype', start_time=60) ])
+    assert get('/metrics') == (None, b'')
+    o.fh.flush()
+    body = get('/metrics')[1]
+    assert body == \
+        b'# HELP qtype DSC dataset qtype\n' \
+        b'# TYPE qtype gauge\n' \
+        b'qtype{server="test-server",node="test-node",qtype="1"} 1\n'
+    encoding, gzipped = get('/metrics', { 'Accept-Encoding': 'gzip' })
+    assert encoding == 'gzip'
+    assert gzip.decompress(gzipped) == body
+
+    # rendered once and given to every scrape until the next interval
+    snapshot = o.metrics.body
+    o.fh.flush()
+    assert o.metrics.body is snapshot
+    o.process([ dataset({ '2': 2 }, name='qtype', start_time=120) ])
+    o.fh.flush()
+    assert get('/metrics')[1].endswith(b'qtype{server="test-server",node="test-node",qtype="2"} 2\n')
+
+    with pytest.raises(urllib.error.HTTPError):
+        get('/')
+    o.close()
+
+    with pytest.raises(Exception):
+        Prometheus({ 'listen': '127.0.0.1:0', 'textfile': 'out' })
+    with pytest.raises(Exception):
+        Prometheus({ 'listen': 'port' })
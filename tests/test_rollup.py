@@ -0,0 +1,31 @@
+import pytest
+from dsc_datatool.transformer.rollup import Rollup
+
+
+def values(datasets):
+    return [ (d.start_time, d.dimensions[0].dimensions[0].values) for d in datasets ]
+
+
+def test_out_of_order(args, dataset):
+    o = Rollup({ 'interval': '10m' })
+    datasets = [ dataset({ '1': 1 }, start_time=t) for t in (1563520800, 1563520560, 1563520620, 1563520860) ]
+    o.process(datasets)
+    assert datasets == []
+
+    # a third interval closes the oldest one
+    datasets = [ dataset({ '1': 1 }, start_time=1563521400) ]
+    o.process(datasets)
+    assert values(datasets) == [ (1563520200, { '1': 2 }) ]
+
+    # an interval that has been closed is given on by itself
+    datasets = [ dataset({ '1': 1 }, start_time=1563520680) ]
+    o.process(datasets)
+    assert values(datasets) == [ (1563520200, { '1': 1 }) ]
+
+    assert values(o.flush()) == [ (1563520800, { '1': 2 }), (1563521400, { '1': 1 }) ]
+
+
+def test_options():
+    for opts in ({}, { 'interval': '0' }, { 'interval': '1x' }, { 'interval': '1m', 'open': '0' }, { 'interval': '1m', 'open': 'a' }):
+        with pytest.raises(Exception):
+            Rollup(opts)